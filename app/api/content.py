@@ -1,21 +1,27 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from app.models.schemas import ContentCreate, ContentResponse
+from app.models.schemas import ContentCreate, ContentResponse, ContentEmbeddingResponse
 from app.models.database import get_db
 from app.db import crud
+from app.db.embedding_codec import decode_embedding, embedding_format
+import base64
 import json
 
 router = APIRouter(prefix="/content", tags=["content"])
 
-def content_to_response(content):
-    """Convert database content to response model"""
+def content_to_response(content, include_embedding: bool = False):
+    """Convert database content to response model, decoding the embedding only when asked"""
+    embedding_vector = None
+    if include_embedding and content.embedding_vector:
+        embedding_vector = decode_embedding(content.embedding_vector).tolist()
+    
     return ContentResponse(
         content_id=content.content_id,
         title=content.title,
         category=content.category,
         tags=json.loads(content.tags) if content.tags else [],
         description=content.description,
-        embedding_vector=json.loads(content.embedding_vector) if content.embedding_vector else None,
+        embedding_vector=embedding_vector,
         created_at=content.created_at
     )
 
@@ -30,12 +36,29 @@ def create_content(content: ContentCreate, db: Session = Depends(get_db)):
     return content_to_response(db_content)
 
 @router.get("/{content_id}", response_model=ContentResponse)
-def get_content(content_id: str, db: Session = Depends(get_db)):
+def get_content(content_id: str, include_embedding: bool = False, db: Session = Depends(get_db)):
     """Get content by ID"""
     content = crud.get_content(db, content_id)
     if not content:
         raise HTTPException(status_code=404, detail="Content not found")
-    return content_to_response(content)
+    return content_to_response(content, include_embedding)
+
+@router.get("/{content_id}/embedding", response_model=ContentEmbeddingResponse)
+def get_content_embedding(content_id: str, db: Session = Depends(get_db)):
+    """Get the stored embedding of a content item as base64 float32"""
+    content = crud.get_content(db, content_id)
+    if not content:
+        raise HTTPException(status_code=404, detail="Content not found")
+    if not content.embedding_vector:
+        raise HTTPException(status_code=404, detail="Embedding not generated yet")
+    
+    embedding = decode_embedding(content.embedding_vector)
+    return ContentEmbeddingResponse(
+        content_id=content.content_id,
+        storage_format=embedding_format(content.embedding_vector),
+        dimension=embedding.shape[0],
+        embedding=base64.b64encode(embedding.astype('<f4').tobytes()).decode('ascii')
+    )
 
 @router.get("/", response_model=list)
 def get_all_content(db: Session = Depends(get_db)):
@@ -1,21 +1,39 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from datetime import datetime
-from app.models.schemas import RecommendationRequest, RecommendationResponse, InteractionCreate, FeedbackRequest
+import hashlib
+import json
+from app.models.schemas import (
+    RecommendationRequest, RecommendationResponse, BatchRecommendationRequest, SimilarContentResponse,
+    InteractionCreate, FeedbackRequest
+)
 from app.models.database import get_db
 from app.db import crud
-from app.ml.recommender import HybridRecommender
+from app.ml.batch_recommend import batch_recommendations, to_ndjson
+from app.ml.engine import get_recommender, get_response_cache, refresh_if_stale
+from app.config import Config
 
 router = APIRouter(prefix="/recommendations", tags=["recommendations"])
 
-# Lazy initialization
-recommender = None
+_BLEND_DEFAULTS = {
+    field: RecommendationRequest.model_fields[field].default
+    for field in ('use_cf', 'use_embeddings', 'cf_weight', 'nprobe', 'ef_search')
+}
 
-def get_recommender():
-    global recommender
-    if recommender is None:
-        recommender = HybridRecommender()
-    return recommender
+def _materializable(req: RecommendationRequest) -> bool:
+    """Stored lists are computed with the default blend, so only such requests can use them"""
+    return Config.MATERIALIZE_RECOMMENDATIONS and req.use_materialized and all(
+        getattr(req, field) == default for field, default in _BLEND_DEFAULTS.items()
+    )
+
+def _response_cache_key(req: RecommendationRequest, user, model_version: str, db: Session) -> str:
+    """Every request field, the serving models, and the user's state: their newest
+    interaction and last interests update. Any of them changing makes a new key.
+    """
+    watermark = [crud.get_latest_interaction_id(db, user.user_id), user.updated_at]
+    payload = json.dumps([req.model_dump(), model_version, watermark], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
 
 @router.post("/", response_model=RecommendationResponse)
 def get_recommendations(req: RecommendationRequest, db: Session = Depends(get_db)):
@@ -25,18 +43,88 @@ def get_recommendations(req: RecommendationRequest, db: Session = Depends(get_db
         raise HTTPException(status_code=404, detail="User not found")
     
     recommender = get_recommender()
+    refresh_if_stale(db)
+    cache = get_response_cache()
+    if cache is None:
+        return _compute_recommendations(req, recommender, db)
+    
+    key = _response_cache_key(req, user, recommender.model_version, db)
+    cached = cache.get(key)
+    if cached is not None:
+        now = datetime.utcnow()
+        computed_at = datetime.fromisoformat(cached['computed_at'])
+        return RecommendationResponse(
+            user_id=req.user_id,
+            recommendations=cached['recommendations'],
+            timestamp=now,
+            materialized=cached['materialized'],
+            computed_at=computed_at,
+            staleness_seconds=(now - computed_at).total_seconds(),
+            cached=True
+        )
+    
+    response = _compute_recommendations(req, recommender, db)
+    cache.set(key, {
+        'recommendations': response.recommendations,
+        'materialized': response.materialized,
+        'computed_at': response.computed_at.isoformat()
+    })
+    return response
+
+def _compute_recommendations(req: RecommendationRequest, recommender, db: Session) -> RecommendationResponse:
+    if _materializable(req):
+        recommendations, computed_at = recommender.recommend_materialized(db, req.user_id, req.n_recommendations)
+        now = datetime.utcnow()
+        return RecommendationResponse(
+            user_id=req.user_id,
+            recommendations=recommendations,
+            timestamp=now,
+            materialized=True,
+            computed_at=computed_at,
+            staleness_seconds=(now - computed_at).total_seconds()
+        )
+    
     recommendations = recommender.recommend(
         db,
         req.user_id,
         n_recommendations=req.n_recommendations,
         use_cf=req.use_cf,
         use_embeddings=req.use_embeddings,
-        cf_weight=req.cf_weight
+        cf_weight=req.cf_weight,
+        nprobe=req.nprobe,
+        ef_search=req.ef_search
     )
     
+    now = datetime.utcnow()
     return RecommendationResponse(
         user_id=req.user_id,
         recommendations=recommendations,
+        timestamp=now,
+        computed_at=now
+    )
+
+@router.post("/batch")
+def get_batch_recommendations(req: BatchRecommendationRequest, db: Session = Depends(get_db)):
+    """Collaborative filtering top-N for many users, streamed as NDJSON (one user per line)"""
+    recommender = get_recommender()
+    refresh_if_stale(db)
+    records = batch_recommendations(
+        recommender.cf_model, req.user_ids, req.n_recommendations, exclude_seen=req.exclude_seen
+    )
+    return StreamingResponse(to_ndjson(records), media_type="application/x-ndjson")
+
+@router.get("/similar/{content_id}", response_model=SimilarContentResponse)
+def get_similar_content(content_id: str, n: int = 10, db: Session = Depends(get_db)):
+    """Get content that the same users engage with, by item factor similarity"""
+    if not crud.get_content(db, content_id):
+        raise HTTPException(status_code=404, detail="Content not found")
+    
+    recommender = get_recommender()
+    refresh_if_stale(db)
+    similar = recommender.similar_content(db, content_id, n)
+    return SimilarContentResponse(
+        content_id=content_id,
+        similar=similar,
         timestamp=datetime.utcnow()
     )
 
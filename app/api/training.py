@@ -1,48 +1,37 @@
-from fastapi import APIRouter, Depends, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from datetime import datetime
-from app.models.schemas import TrainingRequest, TrainingResponse
+from typing import List
+from app.models.schemas import TrainingRequest, TrainingJobResponse
 from app.models.database import get_db
 from app.db import crud
-from app.ml.recommender import HybridRecommender
+from app.ml.engine import get_recommender, get_response_cache, get_training_jobs
 
 router = APIRouter(prefix="/training", tags=["training"])
 
-recommender = None
+@router.post("/train", response_model=TrainingJobResponse, status_code=202)
+def train_models(req: TrainingRequest):
+    """Queue a training job; poll /training/jobs/{job_id} for its progress
+    The job runs in a separate process and its models are hot-swapped in when it completes.
+    """
+    job = get_training_jobs().submit(
+        retrain_cf=req.retrain_cf,
+        regenerate_embeddings=req.regenerate_embeddings,
+        materialize=req.materialize
+    )
+    return job.as_dict()
 
-def get_recommender():
-    global recommender
-    if recommender is None:
-        recommender = HybridRecommender()
-    return recommender
+@router.get("/jobs", response_model=List[TrainingJobResponse])
+def list_training_jobs():
+    """List recent training jobs, newest first"""
+    return [job.as_dict() for job in get_training_jobs().list_jobs()]
 
-@router.post("/train", response_model=TrainingResponse)
-def train_models(req: TrainingRequest, db: Session = Depends(get_db), background_tasks: BackgroundTasks = None):
-    """Train ML models"""
-    recommender = get_recommender()
-    embeddings_generated = 0
-    cf_trained = False
-    
-    # Generate embeddings
-    if req.regenerate_embeddings:
-        embeddings_generated = recommender.generate_all_embeddings(db)
-    
-    # Train CF model
-    if req.retrain_cf:
-        cf_model = recommender.train_cf_model(db)
-        if cf_model:
-            cf_trained = True
-            # Save model
-            model_data = cf_model.get_model_data()
-            crud.save_cf_model(db, model_data, len(cf_model.user_map), len(cf_model.item_map))
-    
-    return TrainingResponse(
-        status="completed",
-        message="Model training completed",
-        embeddings_generated=embeddings_generated,
-        cf_model_trained=cf_trained,
-        timestamp=datetime.utcnow()
-    )
+@router.get("/jobs/{job_id}", response_model=TrainingJobResponse)
+def get_training_job(job_id: str):
+    """Get the status, progress, phase timings and result of a training job"""
+    job = get_training_jobs().get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Training job not found")
+    return job.as_dict()
 
 @router.get("/status")
 def get_training_status(db: Session = Depends(get_db)):
@@ -50,9 +39,15 @@ def get_training_status(db: Session = Depends(get_db)):
     recommender = get_recommender()
     vector_stats = recommender.vector_db.get_index_stats()
     cf_model = crud.get_latest_cf_model(db)
+    jobs = get_training_jobs().list_jobs()
+    response_cache = get_response_cache()
     
     return {
         "vector_db": vector_stats,
+        "latest_job": jobs[0].as_dict() if jobs else None,
+        "user_profile_cache": recommender.user_profile_cache.stats(),
+        "embedding_batcher": recommender.embedding_batcher.stats(),
+        "response_cache": response_cache.stats() if response_cache is not None else None,
         "cf_model": {
             "trained": cf_model is not None,
             "trained_at": cf_model.trained_at if cf_model else None,
@@ -0,0 +1,189 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+class LRUCache:
+    """Thread-safe LRU cache with an optional TTL and hit/miss counters"""
+    
+    def __init__(self, maxsize: int = 1024, ttl: float = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+    
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (entry[0] is not None and entry[0] < time.monotonic()):
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def peek(self, key, default=None):
+        """Read without touching recency or the hit/miss counters"""
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is None or (entry[0] is not None and entry[0] < time.monotonic()):
+            return default
+        return entry[1]
+    
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[1] if entry is not None else default
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0
+        }
+
+
+class SQLiteCache:
+    """LRU cache with an optional TTL in a SQLite file, shared by every worker process on the host
+    Same interface as LRUCache; values must be JSON-serializable. Hit/miss counters are per process.
+    Reads never write: hits are remembered in memory and their recency is written back when the
+    cache is pruned, every maxsize/16 sets, so the size cap can be briefly exceeded by that much.
+    SQLite errors (e.g. "database is locked") count as misses and failed sets are skipped.
+    """
+    
+    def __init__(self, path: str, maxsize: int = 1024, ttl: float = None):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Autocommit; SQLite's file locking serializes writers across processes
+        self._conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+        self._lock = threading.Lock()
+        self._touched = {}  # key -> last hit time, written back by the next prune
+        self._prune_every = max(1, maxsize // 16)
+        self._sets_since_prune = 0
+    
+    def get(self, key, default=None):
+        now = time.time()  # wall clock: expiry times are compared across processes
+        with self._lock:
+            try:
+                row = self._conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error:
+                row = None
+            # Expired rows are left for the next prune to delete
+            if row is None or (row[1] is not None and row[1] < now):
+                self.misses += 1
+                return default
+            self._touched[key] = now
+            self.hits += 1
+        return json.loads(row[0])
+    
+    def peek(self, key, default=None):
+        """Read without touching recency or the hit/miss counters"""
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return default
+        return json.loads(row[0])
+    
+    def set(self, key, value):
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl else None
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), expires_at, now)
+                )
+                self._touched.pop(key, None)
+                self._sets_since_prune += 1
+                if self._sets_since_prune >= self._prune_every:
+                    self._prune(now)
+                    self._sets_since_prune = 0
+            except sqlite3.Error:
+                # Caching is best effort, the caller has its value either way
+                pass
+    
+    def _prune(self, now: float):
+        """Write back the recency of hits, drop expired rows and trim to maxsize in one transaction"""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self._touched:
+                self._conn.executemany("UPDATE cache SET accessed_at = ? WHERE key = ?",
+                                       [(accessed_at, key) for key, accessed_at in self._touched.items()])
+            self._conn.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+            excess = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.maxsize
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at LIMIT ?)", (excess,)
+                )
+            self._conn.execute("COMMIT")
+            self._touched.clear()
+        except sqlite3.Error:
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+            raise
+    
+    def pop(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._touched.pop(key, None)
+        return json.loads(row[0]) if row is not None else default
+    
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+            self._touched.clear()
+    
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'size': size,
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0
+        }
+
+CACHE_BACKENDS = ('memory', 'sqlite')
+
+def make_cache(backend: str, maxsize: int = 1024, ttl: float = None, path: str = None):
+    """Cache of the named backend: 'memory' (per process) or 'sqlite' (shared through the file at path)"""
+    if backend == 'memory':
+        return LRUCache(maxsize=maxsize, ttl=ttl)
+    if backend == 'sqlite':
+        return SQLiteCache(path, maxsize=maxsize, ttl=ttl)
+    raise ValueError(f"Unknown cache backend {backend!r}, expected one of {CACHE_BACKENDS}")
\ No newline at end of file
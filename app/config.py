@@ -7,15 +7,80 @@ class Config:
     DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./dummi_ai.db")
     EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
     VECTOR_DB_PATH = os.getenv("VECTOR_DB_PATH", "./vector_db/embeddings.faiss")
+    CF_MODEL_DIR = os.getenv("CF_MODEL_DIR", "./models/cf")
+    CF_MODELS_KEPT = int(os.getenv("CF_MODELS_KEPT", 5))  # newest artifact versions kept on disk
     FAISS_DIMENSION = int(os.getenv("FAISS_DIMENSION", 384))
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # torch, torch-int8 or onnx
+    EMBEDDING_STORAGE_FORMAT = os.getenv("EMBEDDING_STORAGE_FORMAT", "float32")  # float32, float16 or int8
+    
+    # Bulk embedding generation (see app/ml/embedding_pipeline.py)
+    EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", 1))  # >1 encodes in a process pool
+    EMBEDDING_WORKER_THREADS = int(os.getenv("EMBEDDING_WORKER_THREADS", 1))  # torch threads per worker
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))  # texts per model forward pass
+    EMBEDDING_CHUNK_SIZE = int(os.getenv("EMBEDDING_CHUNK_SIZE", 1024))  # rows read and written per chunk
+    
+    # Online embedding micro-batching (see app/ml/batching.py)
+    EMBEDDING_MICROBATCH_SIZE = int(os.getenv("EMBEDDING_MICROBATCH_SIZE", 32))  # max texts per forward pass
+    EMBEDDING_MICROBATCH_WAIT_MS = float(os.getenv("EMBEDDING_MICROBATCH_WAIT_MS", 2))  # max wait for a batch to fill
+    
+    # Vector index selection (see app/ml/vector_search.choose_index_type)
+    FAISS_MEMORY_BUDGET_MB = int(os.getenv("FAISS_MEMORY_BUDGET_MB", 4096))
+    FAISS_FLAT_MAX_VECTORS = 10_000  # exact search below this size
+    FAISS_IVF_MAX_VECTORS = 1_000_000  # IVF up to here, then HNSW (or IVF-PQ over budget)
+    FAISS_NPROBE = 10  # default IVF lists probed per query
+    FAISS_EF_SEARCH = 64  # default HNSW candidate list size per query
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "true").lower() == "true"
     
     # Recommendation parameters
     TOP_K = 10
-    SIMILARITY_THRESHOLD = 0.3
+    SIMILARITY_THRESHOLD = 0.3  # Min cosine similarity for embedding-based candidates
     COLD_START_THRESHOLD = 5  # Min interactions to use CF
+    # Candidates taken from each source before fusion; independent of the request size, so
+    # stored lists up to this depth rank exactly like live requests
+    CANDIDATE_POOL_SIZE = int(os.getenv("CANDIDATE_POOL_SIZE", 100))
+    FUSION_NORMALIZATION = os.getenv("FUSION_NORMALIZATION", "minmax")  # CF score scaling: minmax, zscore or rank
+    
+    # Batch recommendations (see app/ml/batch_recommend.py)
+    BATCH_RECOMMEND_BLOCK_SIZE = 1024  # users scored per matrix multiply
+    BATCH_RECOMMEND_BLOCK_MB = 256  # cap on one block's users x items score matrix
+    
+    # Materialized recommendations: default-parameter requests are served from a stored
+    # per-user top-N, invalidated by the user's interactions or a new model/index
+    MATERIALIZE_RECOMMENDATIONS = os.getenv("MATERIALIZE_RECOMMENDATIONS", "false").lower() == "true"
+    MATERIALIZED_TOP_N = 50  # minimum depth stored per user, so most request sizes hit
+    
+    # Response cache for POST /recommendations/, keyed on the request, the model/index
+    # version and the user's latest interaction/interest update. "sqlite" shares one
+    # store at RESPONSE_CACHE_PATH between worker processes; "none" disables it.
+    RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+    RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "./cache/responses.sqlite")
+    RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 10_000))
+    RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 60))  # seconds; bounds staleness from other users' activity
+    
+    # Cache of user profile embeddings (saves a model forward pass per request)
+    USER_PROFILE_CACHE_SIZE = int(os.getenv("USER_PROFILE_CACHE_SIZE", 100_000))
+    USER_PROFILE_CACHE_TTL = int(os.getenv("USER_PROFILE_CACHE_TTL", 3600))  # seconds
+    
+    # User query vector: "interests" embeds the interests text, "history" averages the
+    # embeddings of interacted items (falls back to interests without usable history)
+    USER_PROFILE_MODE = os.getenv("USER_PROFILE_MODE", "interests")
+    USER_PROFILE_HALF_LIFE_DAYS = 30  # time decay of interaction weights
+    USER_PROFILE_HISTORY_LIMIT = 200  # most recent interactions used to build the profile
     
     # Collaborative filtering parameters
+    CF_ALGORITHM = os.getenv("CF_ALGORITHM", "nmf")  # nmf or als
     N_FACTORS = 50
     N_EPOCHS = 20
     LEARNING_RATE = 0.01
+    
+    # Implicit ALS parameters (CF_ALGORITHM=als)
+    ALS_REGULARIZATION = 0.01
+    ALS_ALPHA = 1.0  # confidence = 1 + alpha * |interaction weight|
+    ALS_CG_STEPS = 3
+    ALS_N_WORKERS = int(os.getenv("ALS_N_WORKERS", os.cpu_count() or 1))
+    
+    # Background training jobs (see app/ml/training_jobs.py)
+    TRAINING_WORKERS = int(os.getenv("TRAINING_WORKERS", 1))  # jobs trained concurrently, one process each
+    # Seconds between checks for a CF model or vector index saved by another worker
+    MODEL_REFRESH_SECONDS = int(os.getenv("MODEL_REFRESH_SECONDS", 30))
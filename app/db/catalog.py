@@ -0,0 +1,150 @@
+import json
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy.orm import Session
+from app.models.database import Content
+
+class ContentCatalog:
+    """In-memory columnar copy of the content table for the recommendation hot path"""
+
+    def __init__(self):
+        self.loaded = False
+        self.positions = {}  # content_id -> row position in the column lists
+        self.ids = []
+        self.content_ids = []
+        self.titles = []
+        self.categories = []
+        self.tags = []
+        self.tag_postings = {}  # tag -> [row positions], the inverted tag index
+        self.loaded_through = 0  # highest Content.id read from the database
+        self._lock = threading.RLock()
+
+    def load(self, db: Session):
+        """(Re)build the catalog with a single query over the content table"""
+        rows = self._query(db).all()
+
+        with self._lock:
+            self._reset()
+            self._upsert_rows(rows)
+            self.loaded = True
+
+    def ensure_loaded(self, db: Session):
+        if not self.loaded:
+            self.load(db)
+
+    def refresh(self, db: Session):
+        """Load on first use, afterwards pick up rows inserted since, e.g. by other processes
+        One primary key range scan, usually empty; call it once per request, not per row.
+        """
+        if not self.loaded:
+            self.load(db)
+            return
+        rows = self._query(db).filter(Content.id > self.loaded_through).all()
+        if rows:
+            with self._lock:
+                if self.loaded:
+                    self._upsert_rows(rows)
+
+    def invalidate(self):
+        """Drop everything; the next ensure_loaded() reloads from the database"""
+        with self._lock:
+            self._reset()
+
+    def upsert(self, content: Content):
+        """Add or refresh a single content row (called by crud after writes)"""
+        with self._lock:
+            if not self.loaded:
+                # Nothing cached yet, the full load will pick this row up
+                return
+            self._upsert_row(content.id, content.content_id, content.title,
+                             content.category, content.tags)
+
+    def get(self, content_id: str) -> Optional[Dict]:
+        # Locked so a concurrent invalidate() can't swap the columns between reads
+        with self._lock:
+            pos = self.positions.get(content_id)
+            if pos is None:
+                return None
+            return {
+                'content_id': self.content_ids[pos],
+                'title': self.titles[pos],
+                'category': self.categories[pos],
+                'tags': self.tags[pos]
+            }
+
+    def lookup(self, db: Session, content_id: str) -> Optional[Dict]:
+        """Get a cached entry, falling back to the database for rows written by another process"""
+        self.ensure_loaded(db)
+        entry = self.get(content_id)
+        if entry is None:
+            content = db.query(Content).filter(Content.content_id == content_id).first()
+            if content is None:
+                return None
+            self.upsert(content)
+            entry = self.get(content_id)
+        return entry
+
+    def hydrate(self, db: Session, content_ids: List[str]) -> List[Optional[Dict]]:
+        """Resolve content IDs to entries: one refresh() query, then in-memory lookups"""
+        self.refresh(db)
+        return [self.lookup(db, content_id) for content_id in content_ids]
+
+    def tag_overlap(self, tags: Iterable[str]) -> Counter:
+        """Count matching tags per row, touching only the postings of the given tags"""
+        counts = Counter()
+        for tag in tags:
+            counts.update(self.tag_postings.get(tag, ()))
+        return counts
+
+    def __len__(self):
+        return len(self.content_ids)
+
+    def _query(self, db: Session):
+        return db.query(Content.id, Content.content_id, Content.title, Content.category, Content.tags)
+
+    def _upsert_rows(self, rows):
+        for row in rows:
+            self._upsert_row(row.id, row.content_id, row.title, row.category, row.tags)
+            self.loaded_through = max(self.loaded_through, row.id)
+
+    def _reset(self):
+        self.loaded = False
+        self.loaded_through = 0
+        self.positions = {}
+        self.ids = []
+        self.content_ids = []
+        self.titles = []
+        self.categories = []
+        self.tags = []
+        self.tag_postings = {}
+
+    def _upsert_row(self, pk: int, content_id: str, title: str, category: str, tags: str):
+        parsed_tags = json.loads(tags) if tags else []
+        pos = self.positions.get(content_id)
+        if pos is None:
+            pos = len(self.content_ids)
+            self.ids.append(pk)
+            self.content_ids.append(content_id)
+            self.titles.append(title)
+            self.categories.append(category)
+            self.tags.append(parsed_tags)
+            # Published last: readers that find the position find every column filled
+            self.positions[content_id] = pos
+        else:
+            self.ids[pos] = pk
+            self.titles[pos] = title
+            self.categories[pos] = category
+            if set(parsed_tags) == set(self.tags[pos]):
+                # Postings are unchanged, skip the O(len) removals
+                self.tags[pos] = parsed_tags
+                return
+            for tag in set(self.tags[pos]):
+                self.tag_postings[tag].remove(pos)
+            self.tags[pos] = parsed_tags
+
+        for tag in set(parsed_tags):
+            self.tag_postings.setdefault(tag, []).append(pos)
+
+# Process-wide catalog shared by the API and the recommender
+catalog = ContentCatalog()
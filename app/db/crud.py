@@ -1,9 +1,21 @@
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from app.models.database import User, Content, Interaction, UserPreference, CFModel
+from app.models.database import (
+    User, Content, Interaction, UserPreference, CFModel, MaterializedRecommendation, TrainingJobRecord
+)
 from app.models.schemas import UserCreate, ContentCreate, InteractionCreate
+from app.db.catalog import catalog
+from app.db.embedding_codec import encode_embedding
+from app.config import Config
 from datetime import datetime
 import json
 
+# Callbacks run after an interaction is committed, e.g. to update the CF model in place
+interaction_listeners = []
+# Callbacks run after a user's interests change, called with (db, user)
+interests_listeners = []
+
 # ========== USER OPERATIONS ==========
 def create_user(db: Session, user: UserCreate):
     db_user = User(
@@ -23,12 +35,18 @@ def get_user(db: Session, user_id: str):
 def get_all_users(db: Session):
     return db.query(User).all()
 
+def get_user_ids(db: Session) -> list:
+    return [user_id for (user_id,) in db.query(User.user_id).order_by(User.id).all()]
+
 def update_user_interests(db: Session, user_id: str, interests: list):
     user = db.query(User).filter(User.user_id == user_id).first()
     if user:
         user.interests = json.dumps(interests)
         user.updated_at = datetime.utcnow()
+        delete_materialized_recommendations(db, user_id)
         db.commit()
+        for listener in interests_listeners:
+            listener(db, user)
     return user
 
 def add_to_user_history(db: Session, user_id: str, content_id: str):
@@ -55,6 +73,7 @@ def create_content(db: Session, content: ContentCreate):
     db.add(db_content)
     db.commit()
     db.refresh(db_content)
+    catalog.upsert(db_content)
     return db_content
 
 def get_content(db: Session, content_id: str):
@@ -63,17 +82,46 @@ def get_content(db: Session, content_id: str):
 def get_all_content(db: Session):
     return db.query(Content).all()
 
+def get_content_pks(db: Session) -> list:
+    """All Content.id primary keys in ascending order"""
+    return [pk for (pk,) in db.query(Content.id).order_by(Content.id).all()]
+
+def iter_content_chunks(db: Session, chunk_size: int):
+    """Stream the content table in primary key order, chunk_size rows at a time"""
+    last_pk = 0
+    while True:
+        chunk = db.query(Content).filter(Content.id > last_pk).order_by(Content.id).limit(chunk_size).all()
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1].id
+
 def get_content_by_category(db: Session, category: str):
     return db.query(Content).filter(Content.category == category).all()
 
-def update_content_embedding(db: Session, content_id: str, embedding: list):
+def update_content_embedding(db: Session, content_id: str, embedding):
     content = get_content(db, content_id)
     if content:
-        content.embedding_vector = json.dumps(embedding)
+        content.embedding_vector = encode_embedding(embedding, Config.EMBEDDING_STORAGE_FORMAT)
         content.updated_at = datetime.utcnow()
         db.commit()
+        catalog.upsert(content)
     return content
 
+def update_content_embeddings(db: Session, embeddings: list, embedding_model: str):
+    """Store many embeddings in one transaction
+    embeddings: [(content, embedding, embedding text hash), ...]
+    """
+    now = datetime.utcnow()
+    for content, embedding, embedding_hash in embeddings:
+        content.embedding_vector = encode_embedding(embedding, Config.EMBEDDING_STORAGE_FORMAT)
+        content.embedding_hash = embedding_hash
+        content.embedding_model = embedding_model
+        content.updated_at = now
+    db.commit()
+    for content, _, _ in embeddings:
+        catalog.upsert(content)
+
 # ========== INTERACTION OPERATIONS ==========
 def create_interaction(db: Session, interaction: InteractionCreate):
     db_interaction = Interaction(
@@ -83,25 +131,59 @@ def create_interaction(db: Session, interaction: InteractionCreate):
         duration_seconds=interaction.duration_seconds
     )
     db.add(db_interaction)
+    delete_materialized_recommendations(db, interaction.user_id)
     db.commit()
     db.refresh(db_interaction)
     
     # Add to user history
     add_to_user_history(db, interaction.user_id, interaction.content_id)
     
+    for listener in interaction_listeners:
+        listener(db, db_interaction)
+    
     return db_interaction
 
+def get_latest_interaction_id(db: Session, user_id: str):
+    """The user's newest Interaction.id, None before their first interaction"""
+    return db.query(func.max(Interaction.id)).filter(Interaction.user_id == user_id).scalar()
+
 def get_user_interactions(db: Session, user_id: str, limit: int = 100):
     return db.query(Interaction).filter(
         Interaction.user_id == user_id
     ).order_by(Interaction.timestamp.desc()).limit(limit).all()
 
+def get_user_item_interactions(db: Session, user_id: str):
+    """Get a user's full history as list of (content_id, interaction_type)"""
+    return db.query(
+        Interaction.content_id,
+        Interaction.interaction_type
+    ).filter(Interaction.user_id == user_id).all()
+
+def get_item_user_interactions(db: Session, content_id: str):
+    """Get an item's full history as list of (user_id, interaction_type)"""
+    return db.query(
+        Interaction.user_id,
+        Interaction.interaction_type
+    ).filter(Interaction.content_id == content_id).all()
+
 def get_content_interactions(db: Session, content_id: str):
     return db.query(Interaction).filter(Interaction.content_id == content_id).all()
 
 def get_all_interactions(db: Session):
     return db.query(Interaction).all()
 
+def get_seen_pairs(db: Session, user_ids: list = None):
+    """Distinct (user_id, content_id) pairs the users interacted with (all users when user_ids is None)"""
+    query = db.query(Interaction.user_id, Interaction.content_id).distinct()
+    if user_ids is None:
+        return query.all()
+    
+    # Bounded IN lists keep large batches under the database's bound-parameter limit
+    pairs = []
+    for start in range(0, len(user_ids), 1000):
+        pairs.extend(query.filter(Interaction.user_id.in_(user_ids[start:start + 1000])).all())
+    return pairs
+
 def get_interaction_matrix(db: Session):
     """Get user-item interaction matrix as list of (user_id, content_id, rating)"""
     interactions = db.query(
@@ -132,9 +214,11 @@ def get_user_preferences(db: Session, user_id: str):
     return db.query(UserPreference).filter(UserPreference.user_id == user_id).all()
 
 # ========== CF MODEL OPERATIONS ==========
-def save_cf_model(db: Session, model_data: dict, n_users: int, n_items: int, rmse: float = None):
+def save_cf_model(db: Session, model_data: dict, n_users: int, n_items: int, rmse: float = None,
+                  artifact_path: str = None):
     cf_model = CFModel(
         model_data=json.dumps(model_data),
+        artifact_path=artifact_path,
         n_users=n_users,
         n_items=n_items,
         rmse=rmse
@@ -146,3 +230,54 @@ def save_cf_model(db: Session, model_data: dict, n_users: int, n_items: int, rms
 
 def get_latest_cf_model(db: Session):
     return db.query(CFModel).order_by(CFModel.trained_at.desc()).first()
+
+# ========== TRAINING JOB OPERATIONS ==========
+def save_training_job(db: Session, job):
+    """Insert or update the row of a TrainingJob"""
+    row = get_training_job(db, job.job_id)
+    if row is None:
+        row = TrainingJobRecord(job_id=job.job_id)
+        db.add(row)
+    for key in ('retrain_cf', 'regenerate_embeddings', 'materialize', 'status', 'phase', 'error',
+                'created_at', 'started_at', 'finished_at'):
+        setattr(row, key, getattr(job, key))
+    row.progress = json.dumps(job.progress)
+    row.phases = json.dumps(job.phases)
+    row.result = json.dumps(job.result) if job.result is not None else None
+    db.commit()
+    return row
+
+def get_training_job(db: Session, job_id: str):
+    return db.query(TrainingJobRecord).filter(TrainingJobRecord.job_id == job_id).first()
+
+def get_training_jobs(db: Session, limit: int = 100):
+    return db.query(TrainingJobRecord).order_by(TrainingJobRecord.created_at.desc()).limit(limit).all()
+
+# ========== MATERIALIZED RECOMMENDATION OPERATIONS ==========
+def get_materialized_recommendations(db: Session, user_id: str):
+    return db.query(MaterializedRecommendation).filter(MaterializedRecommendation.user_id == user_id).first()
+
+def save_materialized_recommendations(db: Session, user_id: str, recommendations: list, depth: int,
+                                      model_version: str, commit: bool = True):
+    """Store (or replace) a user's precomputed top-depth list as [(content_id, score, method), ...]"""
+    row = get_materialized_recommendations(db, user_id)
+    if row is None:
+        row = MaterializedRecommendation(user_id=user_id)
+        db.add(row)
+    row.recommendations = json.dumps(recommendations)
+    row.n_recommendations = depth
+    row.model_version = model_version
+    row.computed_at = datetime.utcnow()
+    if commit:
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another request materialized this user first; its list is just as good
+            db.rollback()
+    return row
+
+def delete_materialized_recommendations(db: Session, user_id: str):
+    """Invalidate a user's precomputed list; committed with the caller's transaction"""
+    db.query(MaterializedRecommendation).filter(
+        MaterializedRecommendation.user_id == user_id
+    ).delete(synchronize_session=False)
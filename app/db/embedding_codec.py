@@ -0,0 +1,51 @@
+import struct
+import numpy as np
+
+# Blob layout: [codec version byte][format byte][payload]
+CODEC_VERSION = 1
+
+FORMAT_FLOAT32 = 1
+FORMAT_FLOAT16 = 2
+FORMAT_INT8 = 3  # payload: little-endian float32 scale, then one int8 per dimension
+
+STORAGE_FORMATS = {
+    'float32': FORMAT_FLOAT32,
+    'float16': FORMAT_FLOAT16,
+    'int8': FORMAT_INT8
+}
+FORMAT_NAMES = {code: name for name, code in STORAGE_FORMATS.items()}
+
+def encode_embedding(embedding, storage_format: str = 'float32') -> bytes:
+    """Pack an embedding into a compact versioned blob"""
+    fmt = STORAGE_FORMATS[storage_format]
+    vector = np.asarray(embedding, dtype=np.float32).ravel()
+    header = bytes([CODEC_VERSION, fmt])
+    
+    if fmt == FORMAT_FLOAT32:
+        return header + vector.astype('<f4').tobytes()
+    if fmt == FORMAT_FLOAT16:
+        return header + vector.astype('<f2').tobytes()
+    
+    # Symmetric per-vector int8 quantization
+    max_abs = float(np.max(np.abs(vector))) if vector.size else 0.0
+    scale = max_abs / 127 if max_abs > 0 else 1.0
+    quantized = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+    return header + struct.pack('<f', scale) + quantized.tobytes()
+
+def decode_embedding(blob: bytes) -> np.ndarray:
+    """Unpack a blob written by encode_embedding into a float32 vector"""
+    version, fmt = blob[0], blob[1]
+    if version != CODEC_VERSION:
+        raise ValueError(f"Unsupported embedding codec version: {version}")
+    
+    if fmt == FORMAT_FLOAT32:
+        return np.frombuffer(blob, dtype='<f4', offset=2).astype(np.float32)
+    if fmt == FORMAT_FLOAT16:
+        return np.frombuffer(blob, dtype='<f2', offset=2).astype(np.float32)
+    if fmt == FORMAT_INT8:
+        scale = struct.unpack_from('<f', blob, 2)[0]
+        return np.frombuffer(blob, dtype=np.int8, offset=6).astype(np.float32) * scale
+    raise ValueError(f"Unknown embedding storage format: {fmt}")
+
+def embedding_format(blob: bytes) -> str:
+    return FORMAT_NAMES[blob[1]]
@@ -1,15 +1,31 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import users, content, recommendations, training
-from app.models.database import Base, engine
+from app.config import Config
+from app.ml.engine import shutdown_training_jobs, warm_up
+from app.models.database import SessionLocal, init_db
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_db()
+    
+    # Build the shared recommender before taking traffic so the first request doesn't pay for it;
+    # with PRELOAD_MODELS=false the ML stack is only imported by the first ML request
+    if Config.PRELOAD_MODELS:
+        db = SessionLocal()
+        try:
+            warm_up(db)
+        finally:
+            db.close()
+    yield
+    shutdown_training_jobs()
 
 app = FastAPI(
     title="Dummi AI - Content Recommendation Engine",
     description="ML-powered recommendation system with embeddings and collaborative filtering",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -0,0 +1,75 @@
+"""Top-N collaborative filtering recommendations for many users at once, streamed as NDJSON
+
+Usage: python -m app.ml.batch_recommend [--output recs.ndjson] [--n 10] [--users u1 u2 ...]
+"""
+import argparse
+import json
+import sys
+from typing import TYPE_CHECKING, Callable, Iterator, List, Optional
+from sqlalchemy.orm import Session
+from app.config import Config
+from app.db.crud import get_seen_pairs
+from app.models.database import SessionLocal
+
+if TYPE_CHECKING:
+    from app.ml.collaborative_filtering import CollaborativeFiltering
+
+def batch_recommendations(cf_model: "CollaborativeFiltering", user_ids: Optional[List[str]] = None,
+                          n_recommendations: int = 10, exclude_seen: bool = True,
+                          session_factory: Callable[[], Session] = SessionLocal) -> Iterator[dict]:
+    """Score users block by block with one matrix multiply per block
+    Seen items are read per block through a session the iterator opens and closes itself,
+    so it can outlive the caller's session and never holds every user's history at once.
+    Yields: {'user_id': ..., 'recommendations': [{'content_id': ..., 'score': ...}, ...]}
+    """
+    db = session_factory() if exclude_seen else None
+    try:
+        results = cf_model.recommend_batch(
+            user_ids,
+            n_recommendations,
+            seen_pairs=(lambda block_user_ids: get_seen_pairs(db, block_user_ids)) if exclude_seen else None,
+            block_size=Config.BATCH_RECOMMEND_BLOCK_SIZE,
+            max_block_bytes=Config.BATCH_RECOMMEND_BLOCK_MB * 1024 * 1024
+        )
+        for user_id, recs in results:
+            yield {
+                'user_id': user_id,
+                'recommendations': [{'content_id': content_id, 'score': score} for content_id, score in recs]
+            }
+    finally:
+        if db is not None:
+            db.close()
+
+def to_ndjson(records: Iterator[dict]) -> Iterator[str]:
+    """One JSON document per line"""
+    for record in records:
+        yield json.dumps(record) + '\n'
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", help="NDJSON file to write (default: stdout)")
+    parser.add_argument("--n", type=int, default=Config.TOP_K)
+    parser.add_argument("--users", nargs="+", help="user IDs to score (default: every user in the model)")
+    parser.add_argument("--include-seen", action="store_true", help="don't exclude items users interacted with")
+    args = parser.parse_args()
+
+    from app.ml.recommender import load_latest_cf_model
+
+    db = SessionLocal()
+    try:
+        cf_model = load_latest_cf_model(db)
+        if cf_model is None:
+            sys.exit("No trained CF model, run POST /training/train first")
+    finally:
+        db.close()
+    records = batch_recommendations(cf_model, args.users, args.n, exclude_seen=not args.include_seen)
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        output.writelines(to_ndjson(records))
+    finally:
+        if args.output:
+            output.close()
+
+if __name__ == "__main__":
+    main()
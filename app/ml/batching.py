@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+from typing import Callable, List
+import numpy as np
+
+def _bucket(n: int) -> str:
+    """Power-of-two histogram bucket label: 1, 2, 3-4, 5-8, ..."""
+    if n <= 2:
+        return str(n)
+    upper = 1 << (n - 1).bit_length()
+    return f"{upper // 2 + 1}-{upper}"
+
+class MicroBatcher:
+    """Coalesce concurrent single-text encode calls into batched model calls
+    A background thread takes the first pending text, waits up to max_wait_ms for more
+    (or until max_batch_size are queued), runs encode_batch once and resolves every caller.
+    """
+
+    def __init__(self, encode_batch: Callable[[List[str]], np.ndarray],
+                 max_batch_size: int = 32, max_wait_ms: float = 2.0):
+        self.encode_batch = encode_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.items = 0
+        self.batch_sizes = Counter()  # bucket -> batches dispatched
+        self.queue_depths = Counter()  # bucket -> queue depth seen at dispatch
+        self._pending = deque()  # (text, future)
+        self._condition = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+    def submit(self, text: str) -> Future:
+        """Queue a text; the future resolves to its embedding"""
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            self._pending.append((text, future))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return future
+
+    def encode(self, text: str) -> np.ndarray:
+        """Blocking single-text encode through the batcher"""
+        return self.submit(text).result()
+
+    async def encode_async(self, text: str) -> np.ndarray:
+        return await asyncio.wrap_future(self.submit(text))
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                'queue_depth': len(self._pending),
+                'batches': self.batches,
+                'items': self.items,
+                'mean_batch_size': round(self.items / self.batches, 2) if self.batches else 0.0,
+                'batch_size_histogram': dict(self.batch_sizes),
+                'queue_depth_histogram': dict(self.queue_depths),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000
+            }
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+
+                # Give concurrent callers until the deadline to join this batch
+                deadline = time.monotonic() + self.max_wait
+                while len(self._pending) < self.max_batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+                depth = len(self._pending)
+                batch = [self._pending.popleft() for _ in range(min(depth, self.max_batch_size))]
+                self.batches += 1
+                self.items += len(batch)
+                self.batch_sizes[_bucket(len(batch))] += 1
+                self.queue_depths[_bucket(depth)] += 1
+
+            futures = [future for _, future in batch]
+            try:
+                embeddings = self.encode_batch([text for text, _ in batch])
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for future, embedding in zip(futures, embeddings):
+                future.set_result(embedding)
@@ -1,7 +1,44 @@
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from scipy import sparse
 from sklearn.decomposition import NMF
-from typing import Tuple, Dict, List
+from threadpoolctl import threadpool_limits
+from typing import Callable, Iterator, Tuple, Dict, List
 import json
+import os
+import shutil
+import threading
+from datetime import datetime
+
+# Implicit feedback weight of each interaction type
+INTERACTION_WEIGHTS = {
+    'like': 5.0,
+    'click': 2.0,
+    'view_time': 1.0,
+    'skip': -1.0
+}
+
+# Bumped whenever the on-disk artifact layout written by save() changes
+MODEL_FORMAT_VERSION = 1
+
+def read_model_metadata(path: str) -> dict:
+    """metadata.json of a saved artifact directory"""
+    with open(os.path.join(path, 'metadata.json')) as f:
+        metadata = json.load(f)
+    if metadata['format_version'] != MODEL_FORMAT_VERSION:
+        raise ValueError(f"Unsupported CF model format version: {metadata['format_version']}")
+    return metadata
+
+# Ridge term for fold-in solves, keeps single-interaction users well conditioned
+FOLD_IN_REGULARIZATION = 0.1
+
+def _normalize_rows(factors: np.ndarray) -> np.ndarray:
+    """float32 copy with unit L2 norm rows (all-zero rows stay zero)"""
+    rows = np.array(factors, dtype=np.float32)
+    norms = np.linalg.norm(rows, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    rows /= norms
+    return rows
 
 class CollaborativeFiltering:
     def __init__(self, n_factors: int = 50, n_epochs: int = 20, learning_rate: float = 0.01):
@@ -14,48 +51,56 @@ class CollaborativeFiltering:
         self.item_map = {}
         self.reverse_user_map = {}
         self.reverse_item_map = {}
+        self.version = None  # identifies the trained factors, e.g. the artifact directory name
+        self._item_ids = None  # item index -> item ID array for vectorized lookups
+        self._unit_factors = {}  # side -> (L2-normalized factor rows, growth buffer), built on first use
+        # Spare capacity behind user_factors/item_factors for folded-in rows
+        self._user_buffer = None
+        self._item_buffer = None
+        self._lock = threading.Lock()
     
-    def build_interaction_matrix(self, interactions: List[Tuple[str, str, str]]) -> Tuple[np.ndarray, dict, dict]:
-        """Build user-item interaction matrix from interaction data
+    def build_interaction_matrix(self, interactions: List[Tuple[str, str, str]]) -> Tuple[sparse.csr_matrix, dict, dict]:
+        """Build sparse user-item interaction matrix from interaction data
         interactions: [(user_id, content_id, interaction_type), ...]
         Returns: (matrix, user_map, item_map)
         """
-        # Create mappings
-        unique_users = list(set(u for u, _, _ in interactions))
-        unique_items = list(set(i for _, i, _ in interactions))
+        if interactions:
+            user_ids, item_ids, interaction_types = zip(*interactions)
+        else:
+            user_ids, item_ids, interaction_types = (), (), ()
         
-        self.user_map = {uid: idx for idx, uid in enumerate(unique_users)}
-        self.item_map = {iid: idx for idx, iid in enumerate(unique_items)}
+        # Map IDs and interaction types to dense integer codes
+        unique_users, user_codes = np.unique(np.array(user_ids, dtype=str), return_inverse=True)
+        unique_items, item_codes = np.unique(np.array(item_ids, dtype=str), return_inverse=True)
+        unique_types, type_codes = np.unique(np.array(interaction_types, dtype=str), return_inverse=True)
+        
+        self.user_map = {uid: idx for idx, uid in enumerate(unique_users.tolist())}
+        self.item_map = {iid: idx for idx, iid in enumerate(unique_items.tolist())}
         self.reverse_user_map = {idx: uid for uid, idx in self.user_map.items()}
         self.reverse_item_map = {idx: iid for iid, idx in self.item_map.items()}
+        self._item_ids = None
         
-        # Build matrix
-        n_users = len(unique_users)
-        n_items = len(unique_items)
-        matrix = np.zeros((n_users, n_items))
-        
-        # Weight interactions
-        interaction_weights = {
-            'like': 5.0,
-            'click': 2.0,
-            'view_time': 1.0,
-            'skip': -1.0
-        }
+        # Weight interactions, repeated (user, item) pairs are summed by the COO -> CSR conversion
+        type_weights = np.array([INTERACTION_WEIGHTS.get(t, 1.0) for t in unique_types.tolist()])
+        weights = type_weights[type_codes] if len(type_codes) else np.zeros(0)
         
-        for user_id, item_id, interaction_type in interactions:
-            u_idx = self.user_map.get(user_id)
-            i_idx = self.item_map.get(item_id)
-            if u_idx is not None and i_idx is not None:
-                weight = interaction_weights.get(interaction_type, 1.0)
-                matrix[u_idx, i_idx] += weight
+        matrix = sparse.coo_matrix(
+            (weights, (user_codes, item_codes)),
+            shape=(len(unique_users), len(unique_items))
+        ).tocsr()
         
         return matrix, self.user_map, self.item_map
     
-    def train(self, matrix: np.ndarray):
-        """Train CF model using NMF"""
+    def train(self, matrix: sparse.spmatrix):
+        """Train CF model using NMF on the sparse interaction matrix
+        Net-negative cells (mostly skips) are treated as unobserved since NMF needs non-negative input.
+        """
         # Initialize with small random values
         np.random.seed(42)
         
+        positive = sparse.csr_matrix(matrix).maximum(0)
+        positive.eliminate_zeros()
+        
         # Use sklearn's NMF for matrix factorization
         nmf = NMF(
             n_components=self.n_factors,
@@ -64,11 +109,102 @@ class CollaborativeFiltering:
             max_iter=self.n_epochs
         )
         
-        self.user_factors = nmf.fit_transform(matrix)
+        self.user_factors = nmf.fit_transform(positive)
         self.item_factors = nmf.components_.T
+        self._unit_factors = {}
+        self.version = f"unsaved-{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}"
         
         return self.user_factors, self.item_factors
     
+    def fold_in_user(self, user_id: str, interactions: List[Tuple[str, str]]) -> bool:
+        """Fit one user's factors against the fixed item factors instead of retraining
+        interactions: the user's full history as [(content_id, interaction_type), ...]
+        """
+        with self._lock:
+            if self.item_factors is None:
+                return False
+            vector = self._fold_in(interactions, self.item_map, 'item')
+            if vector is None:
+                return False
+            
+            u_idx = self.user_map.get(user_id, self.user_factors.shape[0])
+            # Readers size their ID lookups from the factor rows, so the reverse mapping must
+            # exist before the row does; the forward mapping goes last so a lookup by ID
+            # never returns an index past the factor rows
+            self.reverse_user_map[u_idx] = user_id
+            self._on_row_update('user', u_idx, vector)
+            self.user_factors, self._user_buffer = self._with_row(
+                self.user_factors, self._user_buffer, u_idx, vector
+            )
+            self._update_unit_row('user', u_idx, vector)
+            self.user_map[user_id] = u_idx
+        return True
+    
+    def fold_in_item(self, item_id: str, interactions: List[Tuple[str, str]]) -> bool:
+        """Fit one item's factors against the fixed user factors
+        interactions: the item's history as [(user_id, interaction_type), ...]
+        """
+        with self._lock:
+            if self.user_factors is None:
+                return False
+            vector = self._fold_in(interactions, self.user_map, 'user')
+            if vector is None:
+                return False
+            
+            i_idx = self.item_map.get(item_id, self.item_factors.shape[0])
+            self.reverse_item_map[i_idx] = item_id  # before the row, as in fold_in_user
+            self._on_row_update('item', i_idx, vector)
+            self.item_factors, self._item_buffer = self._with_row(
+                self.item_factors, self._item_buffer, i_idx, vector
+            )
+            self._update_unit_row('item', i_idx, vector)
+            self.item_map[item_id] = i_idx
+        return True
+    
+    def _fold_in(self, interactions: List[Tuple[str, str]], index_map: dict, fixed_side: str):
+        """Sum interaction weights per known row of the fixed side and project them"""
+        weights = {}
+        for key, interaction_type in interactions:
+            idx = index_map.get(key)
+            if idx is not None:
+                weights[idx] = weights.get(idx, 0.0) + INTERACTION_WEIGHTS.get(interaction_type, 1.0)
+        if not weights:
+            return None
+        
+        indices = np.fromiter(weights.keys(), dtype=np.int64, count=len(weights))
+        values = np.fromiter(weights.values(), dtype=np.float64, count=len(weights))
+        return self._project(fixed_side, indices, values)
+    
+    def _project(self, fixed_side: str, indices: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """Non-negative ridge projection of observed weights onto the fixed factors"""
+        fixed = self.item_factors if fixed_side == 'item' else self.user_factors
+        observed = fixed[indices]
+        A = observed.T @ observed + FOLD_IN_REGULARIZATION * np.eye(self.n_factors)
+        vector = np.linalg.solve(A, observed.T @ np.maximum(values, 0))
+        return np.maximum(vector, 0)
+    
+    def _on_row_update(self, side: str, idx: int, vector: np.ndarray):
+        """Hook for models that keep statistics over the factor rows"""
+    
+    def _with_row(self, factors: np.ndarray, buffer: np.ndarray, idx: int, vector: np.ndarray):
+        """Write vector at row idx; a new row goes into a buffer that doubles when full
+        Returns: (factors, buffer)
+        """
+        n = factors.shape[0]
+        if idx == n:
+            if buffer is None or factors.base is not buffer or buffer.shape[0] <= n:
+                # Leaving a memory-mapped artifact makes a private copy of the whole matrix, since
+                # every reader scores one contiguous array. Doubling there would cost 2x the
+                # artifact per worker for a handful of fold-ins, so that first copy only gets 1/8 spare.
+                spare = n // 8 if isinstance(factors, np.memmap) else n
+                buffer = np.zeros((n + max(spare, 16), factors.shape[1]), dtype=factors.dtype)
+                buffer[:n] = factors
+            buffer[n] = vector
+            return buffer[:n + 1], buffer
+        
+        factors[idx] = vector
+        return factors, buffer
+    
     def predict_rating(self, user_id: str, item_id: str) -> float:
         """Predict rating for user-item pair"""
         if self.user_factors is None or self.item_factors is None:
@@ -86,83 +222,367 @@ class CollaborativeFiltering:
     def recommend_for_user(self, user_id: str, n_recommendations: int = 10, 
                           user_interacted_items: set = None) -> List[Tuple[str, float]]:
         """Get top-N recommendations for a user"""
-        if self.user_factors is None or self.item_factors is None:
+        user_factors, item_factors = self.user_factors, self.item_factors
+        if user_factors is None or item_factors is None:
             return []
         
         u_idx = self.user_map.get(user_id)
-        if u_idx is None:
+        if u_idx is None or u_idx >= user_factors.shape[0]:
             return []
         
         # Get predicted ratings for all items
-        predictions = np.dot(self.user_factors[u_idx], self.item_factors.T)
+        predictions = np.dot(user_factors[u_idx], item_factors.T)
+        n_items = predictions.shape[0]
+        k = min(n_recommendations, n_items)
+        if k <= 0:
+            return []
+        
+        # Mask seen items by index instead of testing each ranked item against the set
+        if user_interacted_items:
+            seen = np.fromiter(
+                (idx for idx in map(self.item_map.get, user_interacted_items) if idx is not None and idx < n_items),
+                dtype=np.int64
+            )
+            predictions[seen] = -np.inf
         
-        # Rank items
-        top_item_indices = np.argsort(predictions)[::-1]
+        # Unordered top-k in O(n_items), then sort only those k
+        top = np.argpartition(predictions, n_items - k)[n_items - k:]
+        top = top[np.argsort(-predictions[top])]
+        top = top[np.isfinite(predictions[top])]
+        
+        item_ids = self._item_id_array(n_items)
+        return list(zip(item_ids[top].tolist(), predictions[top].astype(float).tolist()))
+    
+    def _item_id_array(self, n_items: int) -> np.ndarray:
+        """Item index -> item ID array, extended as items are folded in"""
+        item_ids = self._item_ids
+        if item_ids is None or item_ids.shape[0] < n_items:
+            start = 0 if item_ids is None else item_ids.shape[0]
+            added = np.array([self.reverse_item_map[idx] for idx in range(start, n_items)], dtype=object)
+            item_ids = added if item_ids is None else np.concatenate([item_ids, added])
+            self._item_ids = item_ids
+        return item_ids
+    
+    def recommend_batch(self, user_ids: List[str] = None, n_recommendations: int = 10,
+                        seen_pairs: Callable[[List[str]], List[Tuple[str, str]]] = None, block_size: int = 1024,
+                        max_block_bytes: int = 256 * 1024 * 1024) -> Iterator[Tuple[str, List[Tuple[str, float]]]]:
+        """Top-N for many users, scoring one block of users per matrix multiply
+        user_ids: users to score (default: every user in the model); unknown users get []
+        seen_pairs: called with each block's user IDs, returns (user_id, item_id) pairs never to recommend
+        max_block_bytes caps the block's score matrix, and seen pairs are fetched per block,
+        so memory stays bounded for any catalog size
+        Yields: (user_id, [(item_id, score), ...]) in input order
+        """
+        user_factors, item_factors = self.user_factors, self.item_factors
+        if user_factors is None or item_factors is None:
+            for user_id in user_ids or []:
+                yield user_id, []
+            return
         
-        recommendations = []
-        if user_interacted_items is None:
-            user_interacted_items = set()
+        n_items = item_factors.shape[0]
+        item_ids = self._item_id_array(n_items)
+        item_factors_t = np.ascontiguousarray(item_factors.T, dtype=np.float32)
+        k = min(n_recommendations, n_items)
+        rows_per_block = max(1, min(block_size, max_block_bytes // (4 * max(n_items, 1))))
         
-        for idx in top_item_indices:
-            item_id = self.reverse_item_map.get(idx)
-            if item_id and item_id not in user_interacted_items:
-                rating = float(predictions[idx])
-                recommendations.append((item_id, rating))
-                if len(recommendations) >= n_recommendations:
-                    break
+        if user_ids is None:
+            user_ids = [self.reverse_user_map[idx] for idx in range(user_factors.shape[0])]
         
-        return recommendations
+        for start in range(0, len(user_ids), rows_per_block):
+            block_ids = user_ids[start:start + rows_per_block]
+            indices = np.fromiter((self.user_map.get(user_id, -1) for user_id in block_ids),
+                                  dtype=np.int64, count=len(block_ids))
+            known = np.flatnonzero((indices >= 0) & (indices < user_factors.shape[0]))
+            results = {}
+            
+            if known.size and k > 0:
+                scores = np.asarray(user_factors[indices[known]], dtype=np.float32) @ item_factors_t
+                
+                if seen_pairs is not None:
+                    self._mask_seen(scores, indices[known], seen_pairs([block_ids[pos] for pos in known.tolist()]))
+                
+                # Unordered top-k per row in O(n_items), then sort only those k
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                top_scores = np.take_along_axis(scores, top, axis=1)
+                order = np.argsort(-top_scores, axis=1)
+                top = np.take_along_axis(top, order, axis=1)
+                top_scores = np.take_along_axis(top_scores, order, axis=1)
+                
+                for row, pos in enumerate(known.tolist()):
+                    valid = np.isfinite(top_scores[row])
+                    results[pos] = list(zip(item_ids[top[row][valid]].tolist(), top_scores[row][valid].tolist()))
+            
+            for pos, user_id in enumerate(block_ids):
+                yield user_id, results.get(pos, [])
+    
+    def _mask_seen(self, scores: np.ndarray, block_users: np.ndarray, pairs: List[Tuple[str, str]]):
+        """Set scores[row, item] to -inf for each (user_id, item_id) pair; row i scores block_users[i]
+        Pairs whose user or item the model doesn't know are dropped.
+        """
+        if not pairs:
+            return
+        users, inverse = np.unique(block_users, return_inverse=True)  # a user may appear twice in a block
+        pair_users = np.fromiter((self.user_map.get(user_id, -1) for user_id, _ in pairs),
+                                 dtype=np.int64, count=len(pairs))
+        pair_items = np.fromiter((self.item_map.get(item_id, -1) for _, item_id in pairs),
+                                 dtype=np.int64, count=len(pairs))
+        pair_rows = np.minimum(np.searchsorted(users, pair_users), len(users) - 1)
+        known = (users[pair_rows] == pair_users) & (pair_items >= 0) & (pair_items < scores.shape[1])
+        seen = sparse.csr_matrix(
+            (np.ones(int(known.sum()), dtype=bool), (pair_rows[known], pair_items[known])),
+            shape=(len(users), scores.shape[1])
+        )
+        block_seen = seen[inverse].tocoo()
+        scores[block_seen.row, block_seen.col] = -np.inf
     
     def find_similar_users(self, user_id: str, n_similar: int = 5) -> List[Tuple[str, float]]:
-        """Find similar users based on factor vectors"""
-        if self.user_factors is None:
+        """Find similar users based on factor vectors
+        Returns: [(user_id, cosine similarity), ...]
+        """
+        return self._most_similar('user', self.user_map, user_id, n_similar)
+    
+    def find_similar_items(self, item_id: str, n_similar: int = 10) -> List[Tuple[str, float]]:
+        """Find items with the most similar factor vectors
+        Returns: [(item_id, cosine similarity), ...]
+        """
+        return self._most_similar('item', self.item_map, item_id, n_similar)
+    
+    def _most_similar(self, side: str, index_map: dict, key: str, n: int) -> List[Tuple[str, float]]:
+        """Cosine top-n by one matrix-vector product over the normalized rows and argpartition"""
+        if (self.user_factors if side == 'user' else self.item_factors) is None:
             return []
         
-        u_idx = self.user_map.get(user_id)
-        if u_idx is None:
+        idx = index_map.get(key)
+        unit = self._unit_rows(side)
+        if idx is None or idx >= unit.shape[0]:
             return []
         
-        user_vector = self.user_factors[u_idx]
-        
-        # Calculate cosine similarity with all users
-        similarities = []
-        for idx, other_vector in enumerate(self.user_factors):
-            if idx != u_idx:
-                sim = self._cosine_similarity(user_vector, other_vector)
-                other_user_id = self.reverse_user_map.get(idx)
-                if other_user_id:
-                    similarities.append((other_user_id, sim))
+        similarities = unit @ unit[idx]
+        similarities[idx] = -np.inf  # never return the query itself
+        n_rows = similarities.shape[0]
+        k = min(n, n_rows - 1)
+        if k <= 0:
+            return []
         
-        # Return top N similar users
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        return similarities[:n_similar]
+        top = np.argpartition(similarities, n_rows - k)[n_rows - k:]
+        top = top[np.argsort(-similarities[top])]
+        # Fold-ins write the reverse mapping before the normalized row, so every row has an ID
+        if side == 'item':
+            ids = self._item_id_array(n_rows)[top].tolist()
+        else:
+            ids = [self.reverse_user_map[i] for i in top.tolist()]
+        return list(zip(ids, similarities[top].astype(float).tolist()))
     
-    def _cosine_similarity(self, vec1: np.ndarray, vec2: np.ndarray) -> float:
-        """Calculate cosine similarity"""
-        dot_product = np.dot(vec1, vec2)
-        norm_vec1 = np.linalg.norm(vec1)
-        norm_vec2 = np.linalg.norm(vec2)
-        
-        if norm_vec1 == 0 or norm_vec2 == 0:
-            return 0.0
-        
-        return float(dot_product / (norm_vec1 * norm_vec2))
+    def _unit_rows(self, side: str) -> np.ndarray:
+        """L2-normalized factor rows, computed once per trained model and kept current by fold-ins"""
+        cached = self._unit_factors.get(side)
+        if cached is None:
+            with self._lock:
+                cached = self._unit_factors.get(side)
+                if cached is None:
+                    cached = (_normalize_rows(self.user_factors if side == 'user' else self.item_factors), None)
+                    self._unit_factors[side] = cached
+        return cached[0]
     
-    def get_model_data(self) -> dict:
-        """Serialize model for storage"""
+    def _update_unit_row(self, side: str, idx: int, vector: np.ndarray):
+        # Called under self._lock; nothing to do until the normalized rows have been built
+        cached = self._unit_factors.get(side)
+        if cached is not None:
+            unit, buffer = cached
+            self._unit_factors[side] = self._with_row(unit, buffer, idx, _normalize_rows(vector[None, :])[0])
+    
+    def get_model_metadata(self) -> dict:
+        """Small description of the model, stored next to the artifact path"""
         return {
-            'user_factors': self.user_factors.tolist() if self.user_factors is not None else None,
-            'item_factors': self.item_factors.tolist() if self.item_factors is not None else None,
-            'user_map': self.user_map,
-            'item_map': self.item_map,
-            'n_factors': self.n_factors
+            'format_version': MODEL_FORMAT_VERSION,
+            'algorithm': 'nmf',
+            'n_factors': self.n_factors,
+            'n_users': len(self.user_map),
+            'n_items': len(self.item_map)
         }
     
+    def save(self, model_dir: str, keep: int = None) -> str:
+        """Write factors as float32 .npy files plus ID arrays into a new versioned directory
+        The directory is renamed into place once complete, so readers never see a partial model.
+        keep: delete all but the newest keep versions afterwards (default: keep all)
+        Returns: path of the artifact directory
+        """
+        version = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+        path = os.path.join(model_dir, version)
+        tmp_path = os.path.join(model_dir, f'.{version}.tmp')
+        os.makedirs(tmp_path)
+        
+        user_ids = [self.reverse_user_map[idx] for idx in range(len(self.user_map))]
+        item_ids = [self.reverse_item_map[idx] for idx in range(len(self.item_map))]
+        np.save(os.path.join(tmp_path, 'user_factors.npy'),
+                np.asarray(self.user_factors[:len(user_ids)], dtype=np.float32))
+        np.save(os.path.join(tmp_path, 'item_factors.npy'),
+                np.asarray(self.item_factors[:len(item_ids)], dtype=np.float32))
+        np.save(os.path.join(tmp_path, 'user_ids.npy'), np.array(user_ids, dtype=str))
+        np.save(os.path.join(tmp_path, 'item_ids.npy'), np.array(item_ids, dtype=str))
+        with open(os.path.join(tmp_path, 'metadata.json'), 'w') as f:
+            json.dump(self.get_model_metadata(), f)
+        
+        os.rename(tmp_path, path)
+        self.version = version
+        if keep:
+            self._prune_versions(model_dir, keep)
+        return path
+    
+    def _prune_versions(self, model_dir: str, keep: int):
+        # Workers still mapping a deleted version keep reading it until they reload
+        versions = sorted(name for name in os.listdir(model_dir)
+                          if not name.startswith('.') and os.path.isdir(os.path.join(model_dir, name)))
+        for name in versions[:-keep]:
+            shutil.rmtree(os.path.join(model_dir, name), ignore_errors=True)
+    
+    def load(self, path: str):
+        """Load a saved artifact with the factor files memory-mapped
+        Copy-on-write mapping lets workers share the page cache while fold-ins stay private.
+        """
+        self._apply_metadata(read_model_metadata(path))
+        self.version = os.path.basename(os.path.normpath(path))
+        self.user_factors = np.load(os.path.join(path, 'user_factors.npy'), mmap_mode='c')
+        self.item_factors = np.load(os.path.join(path, 'item_factors.npy'), mmap_mode='c')
+        user_ids = np.load(os.path.join(path, 'user_ids.npy')).tolist()
+        item_ids = np.load(os.path.join(path, 'item_ids.npy')).tolist()
+        self.user_map = {uid: idx for idx, uid in enumerate(user_ids)}
+        self.item_map = {iid: idx for idx, iid in enumerate(item_ids)}
+        self.reverse_user_map = dict(enumerate(user_ids))
+        self.reverse_item_map = dict(enumerate(item_ids))
+        self._item_ids = np.array(item_ids, dtype=object)
+        self._unit_factors = {}
+    
+    def _apply_metadata(self, metadata: dict):
+        self.n_factors = metadata['n_factors']
+    
     def load_model_data(self, data: dict):
-        """Load model from serialized data"""
+        """Load model from legacy JSON data stored in the cf_models table"""
         self.user_factors = np.array(data['user_factors']) if data['user_factors'] else None
         self.item_factors = np.array(data['item_factors']) if data['item_factors'] else None
         self.user_map = data['user_map']
         self.item_map = data['item_map']
         self.reverse_user_map = {idx: uid for uid, idx in self.user_map.items()}
         self.reverse_item_map = {idx: iid for iid, idx in self.item_map.items()}
+        self._item_ids = None
+        self._unit_factors = {}
+
+
+class ALSCollaborativeFiltering(CollaborativeFiltering):
+    """Implicit-feedback ALS (Hu, Koren & Volinsky) with conjugate-gradient solves
+    The summed interaction weight r_ui gives preference p_ui = (r_ui > 0) and
+    confidence c_ui = 1 + alpha * |r_ui|, so skips count as confident negatives.
+    """
+    
+    def __init__(self, n_factors: int = 50, n_epochs: int = 15, regularization: float = 0.01,
+                 alpha: float = 1.0, cg_steps: int = 3, n_workers: int = None,
+                 block_size: int = 1024, learning_rate: float = 0.01):
+        super().__init__(n_factors=n_factors, n_epochs=n_epochs, learning_rate=learning_rate)
+        self.regularization = regularization
+        self.alpha = alpha
+        self.cg_steps = cg_steps
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.block_size = block_size
+        self._gramians = {}  # side -> F^T F + reg * I, kept current across fold-ins
+    
+    def train(self, matrix: sparse.spmatrix):
+        """Alternate user and item solves, each split in blocks across a thread pool"""
+        user_items = sparse.csr_matrix(matrix, dtype=np.float32)
+        item_users = user_items.T.tocsr()
+        
+        rng = np.random.default_rng(42)
+        self.user_factors = rng.normal(scale=0.01, size=(user_items.shape[0], self.n_factors)).astype(np.float32)
+        self.item_factors = rng.normal(scale=0.01, size=(user_items.shape[1], self.n_factors)).astype(np.float32)
+        
+        # Parallelism comes from the pool, keep each BLAS call single-threaded to avoid oversubscription
+        with threadpool_limits(limits=1, user_api='blas'), ThreadPoolExecutor(self.n_workers) as pool:
+            for _ in range(self.n_epochs):
+                self._least_squares(pool, user_items, self.user_factors, self.item_factors)
+                self._least_squares(pool, item_users, self.item_factors, self.user_factors)
+        
+        self._gramians = {}
+        self._unit_factors = {}
+        self.version = f"unsaved-{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}"
+        return self.user_factors, self.item_factors
+    
+    def get_model_metadata(self) -> dict:
+        metadata = super().get_model_metadata()
+        metadata.update(algorithm='als', regularization=self.regularization, alpha=self.alpha)
+        return metadata
+    
+    def _apply_metadata(self, metadata: dict):
+        # Fold-ins must solve with the hyperparameters the factors were trained with
+        super()._apply_metadata(metadata)
+        self.regularization = metadata['regularization']
+        self.alpha = metadata['alpha']
+        self._gramians = {}
+    
+    def _gramian(self, side: str) -> np.ndarray:
+        if side not in self._gramians:
+            factors = self.item_factors if side == 'item' else self.user_factors
+            self._gramians[side] = (factors.T @ factors).astype(np.float64) \
+                + self.regularization * np.eye(self.n_factors)
+        return self._gramians[side]
+    
+    def _project(self, fixed_side: str, indices: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """Exact confidence-weighted least squares for one row, as in a full ALS half-step"""
+        fixed = self.item_factors if fixed_side == 'item' else self.user_factors
+        observed = fixed[indices].astype(np.float64)
+        confidence = 1 + self.alpha * np.abs(values)
+        A = self._gramian(fixed_side) + (observed.T * (confidence - 1)) @ observed
+        b = observed.T @ (confidence * (values > 0))
+        return np.linalg.solve(A, b)
+    
+    def _on_row_update(self, side: str, idx: int, vector: np.ndarray):
+        # Rank-one update instead of recomputing F^T F over all rows
+        gramian = self._gramians.get(side)
+        if gramian is None:
+            return
+        factors = self.item_factors if side == 'item' else self.user_factors
+        if idx < factors.shape[0]:
+            old = factors[idx].astype(np.float64)
+            gramian -= np.outer(old, old)
+        gramian += np.outer(vector, vector)
+    
+    def _least_squares(self, pool: ThreadPoolExecutor, interactions: sparse.csr_matrix,
+                       X: np.ndarray, Y: np.ndarray):
+        """Update every row of X in place against the fixed factors Y"""
+        YtY = Y.T @ Y + self.regularization * np.eye(self.n_factors, dtype=np.float32)
+        blocks = range(0, interactions.shape[0], self.block_size)
+        list(pool.map(lambda start: self._cg_block(interactions, X, Y, YtY, start), blocks))
+    
+    def _cg_block(self, interactions: sparse.csr_matrix, X: np.ndarray, Y: np.ndarray,
+                  YtY: np.ndarray, start: int):
+        """Run a few CG steps on (YtY + Yt(C - I)Y) x = Yt C p for all rows of one block at once"""
+        end = min(start + self.block_size, interactions.shape[0])
+        block = interactions[start:end]
+        rows = np.repeat(np.arange(end - start), np.diff(block.indptr))
+        confidence = 1 + self.alpha * np.abs(block.data)
+        
+        def sparse_rows(values):
+            return sparse.csr_matrix((values, block.indices, block.indptr), shape=block.shape)
+        
+        # Right-hand side Yt C p, and A v = YtY v + Yt (C - I) Y v using only observed cells
+        target = sparse_rows(confidence * (block.data > 0)) @ Y
+        item_vectors = Y[block.indices]
+        
+        def apply(v):
+            projected = np.einsum('ij,ij->i', item_vectors, v[rows])
+            return v @ YtY + sparse_rows((confidence - 1) * projected) @ Y
+        
+        x = X[start:end].copy()
+        r = target - apply(x)
+        p = r.copy()
+        rs_old = np.einsum('ij,ij->i', r, r)
+        for _ in range(self.cg_steps):
+            Ap = apply(p)
+            pAp = np.einsum('ij,ij->i', p, Ap)
+            step = np.divide(rs_old, pAp, out=np.zeros_like(rs_old), where=pAp > 0)
+            x += step[:, None] * p
+            r -= step[:, None] * Ap
+            rs_new = np.einsum('ij,ij->i', r, r)
+            beta = np.divide(rs_new, rs_old, out=np.zeros_like(rs_old), where=rs_old > 0)
+            p = r + beta[:, None] * p
+            rs_old = rs_new
+        
+        X[start:end] = x
@@ -0,0 +1,96 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Iterable, Iterator, List, Tuple
+import numpy as np
+from app.config import Config
+
+class EmbeddingProgress:
+    """Counters for a bulk embedding run, readable while it is in progress"""
+
+    def __init__(self, total: int = 0):
+        self.total = total
+        self.encoded = 0
+        self.reused = 0
+        self.chunks = 0
+        self.started_at = time.time()
+        self.finished_at = None
+
+    def chunk_done(self, n_encoded: int):
+        self.encoded += n_encoded
+        self.chunks += 1
+
+    def finish(self):
+        self.finished_at = time.time()
+
+    def as_dict(self) -> dict:
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            'total': self.total,
+            'encoded': self.encoded,
+            'reused': self.reused,
+            'chunks': self.chunks,
+            'running': self.finished_at is None,
+            'elapsed_seconds': round(elapsed, 3),
+            'items_per_second': round(self.encoded / elapsed, 1) if elapsed > 0 else 0.0
+        }
+
+# Per-process model, created once by the pool initializer
+_worker_manager = None
+
+def _init_worker(n_threads: int):
+    global _worker_manager
+    import torch
+    torch.set_num_threads(n_threads)
+    from app.ml.embeddings import EmbeddingManager
+    _worker_manager = EmbeddingManager()
+
+def _encode_chunk(texts: List[str], batch_size: int) -> np.ndarray:
+    return _worker_manager.generate_embeddings_batch(texts, batch_size=batch_size)
+
+class EmbeddingPipeline:
+    """Encode chunks of texts, in worker processes when n_workers > 1
+    Each worker loads its own model with n_threads intra-op threads; at most two chunks per
+    worker are in flight, so memory stays bounded however long the input stream is.
+    """
+
+    def __init__(self, embedding_manager, n_workers: int = None, batch_size: int = None,
+                 n_threads: int = None):
+        self.embedding_manager = embedding_manager
+        self.n_workers = n_workers or Config.EMBEDDING_WORKERS
+        self.batch_size = batch_size or Config.EMBEDDING_BATCH_SIZE
+        self.n_threads = n_threads or Config.EMBEDDING_WORKER_THREADS
+
+    def map_chunks(self, chunks: Iterable[Tuple[object, List[str]]]) -> Iterator[Tuple[object, np.ndarray]]:
+        """Encode (payload, texts) chunks
+        Returns: iterator of (payload, embeddings) in completion order
+        """
+        if self.n_workers <= 1:
+            for payload, texts in chunks:
+                yield payload, self.embedding_manager.generate_embeddings_batch(texts, batch_size=self.batch_size)
+            return
+
+        # spawn: forked children would inherit the parent's torch thread pools and locks
+        with ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.n_threads,)
+        ) as executor:
+            pending = {}
+            chunks = iter(chunks)
+            exhausted = False
+            while pending or not exhausted:
+                while not exhausted and len(pending) < 2 * self.n_workers:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        exhausted = True
+                        break
+                    payload, texts = chunk
+                    pending[executor.submit(_encode_chunk, texts, self.batch_size)] = payload
+
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
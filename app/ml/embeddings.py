@@ -1,21 +1,44 @@
 import numpy as np
 import json
-from sentence_transformers import SentenceTransformer
 from app.config import Config
 
+EMBEDDING_BACKENDS = ('torch', 'torch-int8', 'onnx')
+
+def load_embedding_model(model_name: str, backend: str = 'torch'):
+    """Load the sentence transformer for one inference backend
+    torch: fp32 PyTorch, torch-int8: Linear layers dynamically quantized to int8 on CPU,
+    onnx: ONNX Runtime export (needs the sentence-transformers[onnx] extra)
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend} (expected one of {', '.join(EMBEDDING_BACKENDS)})")
+    
+    # Imported here: pulls in torch, which only model-serving processes need
+    from sentence_transformers import SentenceTransformer
+    
+    if backend == 'torch':
+        return SentenceTransformer(model_name)
+    if backend == 'torch-int8':
+        import torch
+        model = SentenceTransformer(model_name, device='cpu')
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return SentenceTransformer(model_name, device='cpu', backend='onnx')
+
 class EmbeddingManager:
-    def __init__(self):
-        self.model = SentenceTransformer(Config.EMBEDDING_MODEL)
+    def __init__(self, backend: str = None):
+        self.backend = backend or Config.EMBEDDING_BACKEND
+        self.model = load_embedding_model(Config.EMBEDDING_MODEL, self.backend)
         self.dimension = self.model.get_sentence_embedding_dimension()
     
     def generate_embedding(self, text: str) -> np.ndarray:
-        """Generate embedding for a single text"""
-        embedding = self.model.encode(text, convert_to_numpy=True)
+        """Generate unit-length embedding for a single text"""
+        embedding = self.model.encode(text, convert_to_numpy=True, normalize_embeddings=True)
         return embedding
     
-    def generate_embeddings_batch(self, texts: list) -> np.ndarray:
-        """Generate embeddings for multiple texts"""
-        embeddings = self.model.encode(texts, convert_to_numpy=True, show_progress_bar=True)
+    def generate_embeddings_batch(self, texts: list, batch_size: int = None) -> np.ndarray:
+        """Generate unit-length embeddings for multiple texts"""
+        embeddings = self.model.encode(texts, batch_size=batch_size or Config.EMBEDDING_BATCH_SIZE,
+                                       convert_to_numpy=True, show_progress_bar=False,
+                                       normalize_embeddings=True)
         return embeddings
     
     def get_content_embedding_text(self, content: dict) -> str:
@@ -0,0 +1,99 @@
+import threading
+import time
+from typing import TYPE_CHECKING
+from sqlalchemy.orm import Session
+from app.cache import make_cache
+from app.config import Config
+from app.db import crud
+from app.db.catalog import catalog
+from app.ml.training_jobs import TrainingJob, TrainingJobManager
+from app.models.database import SessionLocal
+
+# The ML stack (torch, sentence-transformers, faiss, sklearn) is imported on first use,
+# so routers can import this module without paying for it at startup
+if TYPE_CHECKING:
+    from app.ml.recommender import HybridRecommender
+
+# One recommender per process, shared by every router
+_recommender = None
+_training_jobs = None
+_response_cache = None
+_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_last_refresh_check = 0.0
+
+def get_recommender() -> "HybridRecommender":
+    """Return the process-wide recommender, creating it on first use"""
+    global _recommender
+    if _recommender is None:
+        with _lock:
+            if _recommender is None:
+                from app.ml.recommender import HybridRecommender
+                _recommender = HybridRecommender(mmap_index=True)
+                crud.interaction_listeners.append(_recommender.observe_interaction)
+                crud.interests_listeners.append(_recommender.invalidate_user_profile)
+    return _recommender
+
+def warm_up(db: Session) -> "HybridRecommender":
+    """Load the embedding model, vector index, latest CF model and catalog before serving"""
+    recommender = get_recommender()
+    recommender.load_cf_model(db)
+    catalog.ensure_loaded(db)
+    return recommender
+
+def refresh_if_stale(db: Session):
+    """Pick up models other workers saved (e.g. a training job submitted to another process),
+    checking at most every MODEL_REFRESH_SECONDS; concurrent requests don't wait on a check
+    """
+    global _last_refresh_check
+    if _recommender is None or time.monotonic() - _last_refresh_check < Config.MODEL_REFRESH_SECONDS:
+        return
+    if not _refresh_lock.acquire(blocking=False):
+        return
+    try:
+        _last_refresh_check = time.monotonic()
+        _recommender.refresh(db)
+    finally:
+        _refresh_lock.release()
+
+def get_response_cache():
+    """Return the process-wide recommendation response cache, None when disabled"""
+    global _response_cache
+    if _response_cache is None and Config.RESPONSE_CACHE_BACKEND != 'none':
+        with _lock:
+            if _response_cache is None:
+                _response_cache = make_cache(
+                    Config.RESPONSE_CACHE_BACKEND,
+                    maxsize=Config.RESPONSE_CACHE_SIZE,
+                    ttl=Config.RESPONSE_CACHE_TTL,
+                    path=Config.RESPONSE_CACHE_PATH
+                )
+    return _response_cache
+
+def get_training_jobs() -> TrainingJobManager:
+    """Return the process-wide training job manager, creating it on first use"""
+    global _training_jobs
+    if _training_jobs is None:
+        with _lock:
+            if _training_jobs is None:
+                _training_jobs = TrainingJobManager(on_complete=[_load_job_artifacts])
+    return _training_jobs
+
+def shutdown_training_jobs():
+    """Wait for running training jobs and stop the job pool, if one was started"""
+    if _training_jobs is not None:
+        _training_jobs.shutdown()
+
+def _load_job_artifacts(job: TrainingJob):
+    """Hot-swap what a finished training job wrote into the serving recommender"""
+    if _recommender is None:
+        # Nothing is serving yet; the first get_recommender()/warm_up() reads the new files
+        return
+    if job.regenerate_embeddings:
+        _recommender.reload_vector_index()
+    if job.result['cf_model_trained']:
+        db = SessionLocal()
+        try:
+            _recommender.load_cf_model(db)
+        finally:
+            db.close()
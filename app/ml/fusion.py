@@ -0,0 +1,67 @@
+from typing import List, Sequence, Tuple
+import numpy as np
+
+NORMALIZATIONS = ('minmax', 'zscore', 'rank')
+
+def normalize_scores(scores: np.ndarray, method: str = 'minmax') -> np.ndarray:
+    """Rescale one source's scores so sources with different ranges can be summed
+    minmax: [0, 1]; zscore: zero mean, unit variance; rank: best 1.0 down to 1/n
+    """
+    if method == 'minmax':
+        low = scores.min()
+        return (scores - low) / (scores.max() - low + 1e-10)
+    if method == 'zscore':
+        return (scores - scores.mean()) / (scores.std() + 1e-10)
+    if method == 'rank':
+        ranks = np.empty(len(scores))
+        ranks[np.argsort(-scores, kind='stable')] = np.arange(len(scores))
+        return 1.0 - ranks / len(scores)
+    raise ValueError(f"Unknown score normalization {method!r}, expected one of {NORMALIZATIONS}")
+
+class ScoreFusion:
+    """Weighted sum of scored candidate lists from several sources
+    Each source is normalized once as a whole and scattered into one score array over the
+    union of candidates, so adding a source costs array operations, not per-item Python.
+    """
+
+    def __init__(self, normalization: str = 'minmax'):
+        if normalization not in NORMALIZATIONS:
+            raise ValueError(f"Unknown score normalization {normalization!r}, expected one of {NORMALIZATIONS}")
+        self.normalization = normalization
+        self._positions = {}  # candidate ID -> slot in the fused score array
+        self._slots = []  # (slot array, weighted scores) per source
+
+    def add(self, candidates: Sequence[Tuple[str, float]], weight: float = 1.0, normalize: bool = True):
+        """Add a source's (candidate ID, score) pairs
+        normalize=False keeps scores already on a common scale (e.g. cosine similarity) as they are.
+        """
+        if not candidates:
+            return
+        ids, scores = zip(*candidates)
+        scores = np.asarray(scores, dtype=np.float64)
+        if normalize:
+            scores = normalize_scores(scores, self.normalization)
+        positions = self._positions
+        slots = np.fromiter(
+            (positions.setdefault(candidate_id, len(positions)) for candidate_id in ids),
+            dtype=np.int64, count=len(ids)
+        )
+        self._slots.append((slots, scores * weight))
+
+    def __len__(self):
+        return len(self._positions)
+
+    def top_k(self, k: int) -> List[Tuple[str, float]]:
+        """Highest fused scores first; ties keep the order candidates were first added in"""
+        n = len(self._positions)
+        k = min(k, n)
+        if k <= 0:
+            return []
+        fused = np.zeros(n)
+        for slots, scores in self._slots:
+            np.add.at(fused, slots, scores)
+
+        top = np.argpartition(-fused, k - 1)[:k] if k < n else np.arange(n)
+        top = top[np.lexsort((top, -fused[top]))]
+        ids = np.array(list(self._positions), dtype=object)  # slots were assigned in insertion order
+        return list(zip(ids[top].tolist(), fused[top].tolist()))
@@ -1,27 +1,175 @@
+import hashlib
+import heapq
+import os
+from datetime import datetime
 import numpy as np
-from typing import List, Tuple, Dict
+from typing import Callable, List, Optional, Tuple, Dict
 from sqlalchemy.orm import Session
 from app.ml.embeddings import EmbeddingManager
-from app.ml.vector_search import VectorDatabase
-from app.ml.collaborative_filtering import CollaborativeFiltering
-from app.db.crud import get_user, get_all_content, get_user_interactions, get_interaction_matrix
+from app.ml.vector_search import VectorDatabase, INDEX_HNSW, read_current_snapshot
+from app.ml.embedding_pipeline import EmbeddingPipeline, EmbeddingProgress
+from app.ml.batching import MicroBatcher
+from app.ml.fusion import ScoreFusion
+from app.ml.collaborative_filtering import (
+    CollaborativeFiltering, ALSCollaborativeFiltering, INTERACTION_WEIGHTS, read_model_metadata
+)
+from app.db.crud import (
+    get_user, get_content_pks, iter_content_chunks, get_user_interactions, get_interaction_matrix, get_latest_cf_model,
+    get_user_item_interactions, get_item_user_interactions, update_content_embeddings, get_user_ids,
+    get_materialized_recommendations, save_materialized_recommendations
+)
+from app.db.catalog import catalog
+from app.db.embedding_codec import decode_embedding
+from app.cache import LRUCache
 from app.config import Config
 import json
 
-class HybridRecommender:
-    def __init__(self):
-        self.embedding_manager = EmbeddingManager()
-        self.vector_db = VectorDatabase()
-        self.cf_model = CollaborativeFiltering(
+def new_cf_model(algorithm: str = None) -> CollaborativeFiltering:
+    """Untrained CF model of the given algorithm (default: the configured one)"""
+    if (algorithm or Config.CF_ALGORITHM) == 'als':
+        return ALSCollaborativeFiltering(
             n_factors=Config.N_FACTORS,
             n_epochs=Config.N_EPOCHS,
-            learning_rate=Config.LEARNING_RATE
+            regularization=Config.ALS_REGULARIZATION,
+            alpha=Config.ALS_ALPHA,
+            cg_steps=Config.ALS_CG_STEPS,
+            n_workers=Config.ALS_N_WORKERS
+        )
+    return CollaborativeFiltering(
+        n_factors=Config.N_FACTORS,
+        n_epochs=Config.N_EPOCHS,
+        learning_rate=Config.LEARNING_RATE
+    )
+
+def fit_cf_model(db: Session):
+    """Train a CF model on every stored interaction, without touching any serving state
+    Returns: the trained model, or None when there is nothing to train on
+    """
+    interactions = get_interaction_matrix(db)
+    if not interactions:
+        return None
+    
+    cf_model = new_cf_model()
+    matrix, user_map, item_map = cf_model.build_interaction_matrix(interactions)
+    
+    if matrix.nnz == 0:
+        return None
+    
+    cf_model.train(matrix)
+    return cf_model
+
+def cf_record_version(cf_record) -> str:
+    """Version a CF model loaded from this cf_models row will have"""
+    if cf_record.artifact_path:
+        return os.path.basename(os.path.normpath(cf_record.artifact_path))
+    return f"legacy-{cf_record.id}"
+
+def load_latest_cf_model(db: Session):
+    """Load the most recently saved CF model
+    Returns: the model, or None when nothing usable has been saved
+    """
+    cf_record = get_latest_cf_model(db)
+    if cf_record is None:
+        return None
+    
+    # The artifact's own algorithm, which may differ from CF_ALGORITHM if that changed since
+    if cf_record.artifact_path:
+        cf_model = new_cf_model(read_model_metadata(cf_record.artifact_path)['algorithm'])
+        cf_model.load(cf_record.artifact_path)
+    elif cf_record.model_data and 'user_factors' in json.loads(cf_record.model_data):
+        model_data = json.loads(cf_record.model_data)
+        cf_model = new_cf_model(model_data.get('algorithm', 'nmf'))
+        cf_model.load_model_data(model_data)
+        cf_model.version = cf_record_version(cf_record)
+    else:
+        return None
+    return cf_model
+
+class HybridRecommender:
+    def __init__(self, mmap_index: bool = False):
+        self.mmap_index = mmap_index
+        self.embedding_manager = EmbeddingManager()
+        self.vector_db = VectorDatabase(mmap=mmap_index)
+        self.cf_model = new_cf_model()
+        # user_id -> (interests fingerprint, profile embedding)
+        self.user_profile_cache = LRUCache(
+            maxsize=Config.USER_PROFILE_CACHE_SIZE, ttl=Config.USER_PROFILE_CACHE_TTL
+        )
+        # user_id -> (decayed weighted sum of interacted item vectors, latest interaction time)
+        self.history_profile_cache = LRUCache(
+            maxsize=Config.USER_PROFILE_CACHE_SIZE, ttl=Config.USER_PROFILE_CACHE_TTL
+        )
+        self.embedding_progress = EmbeddingProgress()
+        self.embedding_progress.finish()
+        # Concurrent requests share model forward passes for their profile embeddings
+        self.embedding_batcher = MicroBatcher(
+            self.embedding_manager.generate_embeddings_batch,
+            max_batch_size=Config.EMBEDDING_MICROBATCH_SIZE,
+            max_wait_ms=Config.EMBEDDING_MICROBATCH_WAIT_MS
+        )
+    
+    @property
+    def model_version(self) -> str:
+        """Identifies the CF model and vector index in use; equal across processes serving the same artifacts"""
+        return f"cf:{self.cf_model.version}|index:{self.vector_db.version}"
+    
+    def publish_cf_model(self, cf_model: CollaborativeFiltering):
+        """Swap in a trained CF model; in-flight requests keep the instance they started with"""
+        self.cf_model = cf_model
+    
+    def reload_vector_index(self):
+        """Swap in the vector index last saved to disk (e.g. by a training job process)"""
+        self.vector_db = VectorDatabase(mmap=self.mmap_index)
+        # History profiles are sums of the old item vectors
+        self.history_profile_cache.clear()
+    
+    def load_cf_model(self, db: Session) -> bool:
+        """Load the most recently saved CF model, if any"""
+        cf_model = load_latest_cf_model(db)
+        if cf_model is None:
+            return False
+        self.publish_cf_model(cf_model)
+        return True
+    
+    def refresh(self, db: Session) -> bool:
+        """Reload the vector index or CF model if another process saved a newer one
+        Returns: whether anything was reloaded
+        """
+        reloaded = False
+        if read_current_snapshot(self.vector_db.store_dir) not in (None, self.vector_db.snapshot):
+            self.reload_vector_index()
+            reloaded = True
+        cf_record = get_latest_cf_model(db)
+        if cf_record is not None and cf_record_version(cf_record) != self.cf_model.version:
+            reloaded = self.load_cf_model(db) or reloaded
+        return reloaded
+    
+    def observe_interaction(self, db: Session, interaction):
+        """Apply a new interaction to live state: the user's history profile, then a CF
+        fold-in (new item first, then the user)
+        """
+        self._update_history_profile(interaction)
+        
+        cf_model = self.cf_model
+        if cf_model.item_factors is None:
+            return
+        
+        if interaction.content_id not in cf_model.item_map:
+            cf_model.fold_in_item(
+                interaction.content_id, get_item_user_interactions(db, interaction.content_id)
+            )
+        cf_model.fold_in_user(
+            interaction.user_id, get_user_item_interactions(db, interaction.user_id)
         )
     
     def recommend(self, db: Session, user_id: str, n_recommendations: int = 10,
                   use_cf: bool = True, use_embeddings: bool = True, 
-                  cf_weight: float = 0.5) -> List[Dict]:
-        """Hybrid recommendation combining embeddings and collaborative filtering"""
+                  cf_weight: float = 0.5, nprobe: int = None, ef_search: int = None) -> List[Dict]:
+        """Hybrid recommendation combining embeddings and collaborative filtering
+        nprobe / ef_search: optional per-request vector search recall/latency knobs
+        Each source contributes the same candidate pool for any n_recommendations up to
+        CANDIDATE_POOL_SIZE, so a shorter list is a prefix of a longer one (stored lists rely on this).
+        """
         
         user = get_user(db, user_id)
         if not user:
@@ -34,69 +182,142 @@ class HybridRecommender:
         # Check if cold-start user
         is_cold_start = len(user_interactions) < Config.COLD_START_THRESHOLD
         
-        recommendations = {}
+        fusion = ScoreFusion(Config.FUSION_NORMALIZATION)
+        n_candidates = max(Config.CANDIDATE_POOL_SIZE, n_recommendations)
         
-        # 1. Embedding-based recommendations
+        # 1. Embedding-based recommendations (cosine similarities, used as they are)
         if use_embeddings and not is_cold_start:
             embedding_recs = self._get_embedding_based_recommendations(
-                db, user_id, user_interacted_items, n_recommendations * 2
+                db, user_id, user_interacted_items, n_candidates,
+                nprobe=nprobe, ef_search=ef_search
             )
-            for content_id, score in embedding_recs:
-                recommendations[content_id] = recommendations.get(content_id, 0) + score * (1 - cf_weight)
+            fusion.add(embedding_recs, weight=1 - cf_weight, normalize=False)
         
-        # 2. Collaborative filtering recommendations
+        # 2. Collaborative filtering recommendations (unbounded factor dot products, normalized)
         if use_cf and not is_cold_start:
-            cf_recs = self.cf_model.recommend_for_user(
-                user_id, n_recommendations * 2, user_interacted_items
+            cf_model = self.cf_model
+            cf_recs = cf_model.recommend_for_user(
+                user_id, n_candidates, user_interacted_items
             )
-            for content_id, score in cf_recs:
-                # Normalize CF scores to 0-1
-                cf_scores = [s for _, s in cf_recs]
-                min_score = np.min(cf_scores) if cf_scores else 0
-                max_score = np.max(cf_scores) if cf_scores else 1
-                normalized_score = (score - min_score) / (max_score - min_score + 1e-10)
-                recommendations[content_id] = recommendations.get(content_id, 0) + normalized_score * cf_weight
+            fusion.add(cf_recs, weight=cf_weight)
         
         # 3. Content-based on interests (for cold-start users)
-        if is_cold_start or not recommendations:
+        if is_cold_start or not len(fusion):
             interest_recs = self._get_interest_based_recommendations(
-                db, user, user_interacted_items, n_recommendations * 2
+                db, user, user_interacted_items, n_candidates
             )
-            for content_id, score in interest_recs:
-                recommendations[content_id] = recommendations.get(content_id, 0) + score
-        
-        # Sort and return top N
-        sorted_recs = sorted(recommendations.items(), key=lambda x: x[1], reverse=True)
+            fusion.add(interest_recs, normalize=False)
         
+        top = fusion.top_k(n_recommendations)
         result = []
-        for content_id, score in sorted_recs[:n_recommendations]:
-            content = next((c for c in get_all_content(db) if c.content_id == content_id), None)
+        for (content_id, score), content in zip(top, catalog.hydrate(db, [content_id for content_id, _ in top])):
             if content:
                 result.append({
                     'content_id': content_id,
-                    'title': content.title,
-                    'category': content.category,
+                    'title': content['title'],
+                    'category': content['category'],
                     'score': float(score),
                     'method': 'hybrid'
                 })
         
         return result
     
+    def recommend_materialized(self, db: Session, user_id: str,
+                               n_recommendations: int = 10) -> Tuple[List[Dict], Optional[datetime]]:
+        """Default-parameter recommendations served from the user's precomputed list
+        A missing list, or one computed by other models or too shallow for the request, is
+        recomputed at max(n_recommendations, MATERIALIZED_TOP_N) and stored.
+        Returns: (recommendations, when the list was computed)
+        """
+        model_version = self.model_version
+        row = get_materialized_recommendations(db, user_id)
+        if row is not None and row.model_version == model_version and row.n_recommendations >= n_recommendations:
+            stored = json.loads(row.recommendations)[:n_recommendations]
+            result = []
+            for (content_id, score, method), content in zip(
+                    stored, catalog.hydrate(db, [content_id for content_id, _, _ in stored])):
+                if content:
+                    result.append({
+                        'content_id': content_id,
+                        'title': content['title'],
+                        'category': content['category'],
+                        'score': score,
+                        'method': method
+                    })
+            return result, row.computed_at
+        
+        if get_user(db, user_id) is None:
+            return [], None
+        depth = max(n_recommendations, Config.MATERIALIZED_TOP_N)
+        recommendations, row = self._materialize_user(db, user_id, depth, model_version)
+        return recommendations[:n_recommendations], row.computed_at
+    
+    def materialize_all(self, db: Session, on_progress: Callable[[int, int], None] = None) -> int:
+        """Precompute and store every user's top MATERIALIZED_TOP_N list, e.g. after training
+        Returns: number of users materialized
+        """
+        user_ids = get_user_ids(db)
+        model_version = self.model_version
+        for done, user_id in enumerate(user_ids, 1):
+            self._materialize_user(db, user_id, Config.MATERIALIZED_TOP_N, model_version, commit=False)
+            if done % 500 == 0:
+                db.commit()
+                if on_progress is not None:
+                    on_progress(done, len(user_ids))
+        db.commit()
+        if on_progress is not None:
+            on_progress(len(user_ids), len(user_ids))
+        return len(user_ids)
+    
+    def _materialize_user(self, db: Session, user_id: str, depth: int, model_version: str, commit: bool = True):
+        """Returns: (recommendations, stored row)"""
+        recommendations = self.recommend(db, user_id, depth)
+        return recommendations, save_materialized_recommendations(
+            db,
+            user_id,
+            [[rec['content_id'], rec['score'], rec['method']] for rec in recommendations],
+            depth,
+            model_version,
+            commit=commit
+        )
+    
+    def similar_content(self, db: Session, content_id: str, n: int = 10) -> List[Dict]:
+        """Items whose CF factors are closest to this item's (people who engage with one engage with the other)"""
+        similar = self.cf_model.find_similar_items(content_id, n)
+        
+        result = []
+        for (similar_id, score), content in zip(similar, catalog.hydrate(db, [similar_id for similar_id, _ in similar])):
+            if content:
+                result.append({
+                    'content_id': similar_id,
+                    'title': content['title'],
+                    'category': content['category'],
+                    'score': score,
+                    'method': 'cf_item_similarity'
+                })
+        return result
+    
     def _get_embedding_based_recommendations(self, db: Session, user_id: str,
                                             user_interacted_items: set,
-                                            n_recommendations: int) -> List[Tuple[str, float]]:
+                                            n_recommendations: int, nprobe: int = None,
+                                            ef_search: int = None) -> List[Tuple[str, float]]:
         """Get recommendations based on content similarity to user's interests"""
         user = get_user(db, user_id)
-        if not user or not user.interests:
+        if not user:
             return []
         
-        # Generate user profile embedding from interests
-        user_interests = json.loads(user.interests)
-        user_interests_text = ' '.join(user_interests)
-        user_embedding = self.embedding_manager.generate_embedding(user_interests_text)
+        user_embedding = None
+        if Config.USER_PROFILE_MODE == 'history':
+            user_embedding = self._get_history_profile_embedding(db, user_id)
+        if user_embedding is None:
+            if not user.interests:
+                return []
+            user_embedding = self._get_user_profile_embedding(user)
         
         # Search for similar content
-        similar_content = self.vector_db.search_similar(user_embedding, n_recommendations)
+        similar_content = self.vector_db.search_similar(
+            user_embedding, n_recommendations, nprobe=nprobe, ef_search=ef_search
+        )
         
         # Filter out already interacted items
         recommendations = []
@@ -106,72 +327,204 @@ class HybridRecommender:
         
         return recommendations
     
+    def _get_user_profile_embedding(self, user) -> np.ndarray:
+        """Embedding of the user's interests, cached until the interests change"""
+        fingerprint = hashlib.sha1(user.interests.encode('utf-8')).hexdigest()
+        cached = self.user_profile_cache.get(user.user_id)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+        
+        # Generate user profile embedding from interests
+        user_interests = json.loads(user.interests)
+        user_interests_text = ' '.join(user_interests)
+        user_embedding = self.embedding_batcher.encode(user_interests_text)
+        self.user_profile_cache.set(user.user_id, (fingerprint, user_embedding))
+        return user_embedding
+    
+    def _get_history_profile_embedding(self, db: Session, user_id: str):
+        """Weighted, time-decayed mean of the embeddings of items the user interacted with
+        Returns None when none of those items has a vector yet.
+        """
+        state = self.history_profile_cache.get(user_id)
+        if state is None:
+            state = self._build_history_profile(db, user_id)
+            if state is None:
+                return None
+            self.history_profile_cache.set(user_id, state)
+        
+        profile, _ = state
+        norm = np.linalg.norm(profile)
+        return profile / norm if norm > 1e-9 else None
+    
+    def _build_history_profile(self, db: Session, user_id: str):
+        """Returns: (weighted vector sum decayed to the latest interaction, latest timestamp)"""
+        interactions = get_user_interactions(db, user_id, limit=Config.USER_PROFILE_HISTORY_LIMIT)
+        catalog.ensure_loaded(db)
+        
+        pks = []
+        weights = []
+        timestamps = []
+        for interaction in interactions:
+            pos = catalog.positions.get(interaction.content_id)
+            if pos is not None:
+                pks.append(catalog.ids[pos])
+                weights.append(INTERACTION_WEIGHTS.get(interaction.interaction_type, 1.0))
+                timestamps.append(interaction.timestamp)
+        
+        # One gather from the vector store for the whole history
+        found, vectors = self.vector_db.get_vectors(pks)
+        if not found.any():
+            return None
+        
+        # Decay every interaction relative to the newest one
+        latest = max(timestamps)
+        ages = np.array([(latest - timestamp).total_seconds() for timestamp in timestamps])
+        decay = 0.5 ** (ages / (Config.USER_PROFILE_HALF_LIFE_DAYS * 86400))
+        return (np.asarray(weights) * decay) @ vectors, latest
+    
+    def _update_history_profile(self, interaction):
+        """Fold one interaction into a cached history profile without touching the database"""
+        state = self.history_profile_cache.peek(interaction.user_id)
+        pos = catalog.positions.get(interaction.content_id)
+        if state is None or pos is None:
+            return
+        found, vectors = self.vector_db.get_vectors([catalog.ids[pos]])
+        if not found[0]:
+            return
+        
+        profile, latest = state
+        age = max((interaction.timestamp - latest).total_seconds(), 0.0)
+        decay = 0.5 ** (age / (Config.USER_PROFILE_HALF_LIFE_DAYS * 86400))
+        weight = INTERACTION_WEIGHTS.get(interaction.interaction_type, 1.0)
+        self.history_profile_cache.set(
+            interaction.user_id, (profile * decay + weight * vectors[0], max(interaction.timestamp, latest))
+        )
+    
+    def invalidate_user_profile(self, db: Session, user):
+        """Drop the cached profile embedding after the user's interests change"""
+        self.user_profile_cache.pop(user.user_id)
+    
     def _get_interest_based_recommendations(self, db: Session, user,
                                            user_interacted_items: set,
                                            n_recommendations: int) -> List[Tuple[str, float]]:
         """Content-based recommendations using user interests"""
-        all_content = get_all_content(db)
-        recommendations = {}
-        
-        for content in all_content:
-            if content.content_id in user_interacted_items:
-                continue
-            
-            # Calculate interest match score
-            content_tags = set(json.loads(content.tags)) if content.tags else set()
-            user_interests = set(json.loads(user.interests)) if user.interests else set()
-            
-            if not user_interests:
-                continue
-            
-            overlap = len(content_tags & user_interests)
-            score = overlap / len(user_interests) if user_interests else 0
-            
-            if score > 0:
-                recommendations[content.content_id] = score
-        
-        # Convert to list and sort
-        return sorted(recommendations.items(), key=lambda x: x[1], reverse=True)[:n_recommendations]
-    
-    def train_cf_model(self, db: Session):
-        """Train collaborative filtering model"""
-        interactions = get_interaction_matrix(db)
-        if not interactions:
-            return None
-        
-        matrix, user_map, item_map = self.cf_model.build_interaction_matrix(interactions)
+        user_interests = set(json.loads(user.interests)) if user.interests else set()
+        if not user_interests:
+            return []
         
-        if matrix.size == 0:
-            return None
+        # Score only the items sharing at least one tag with the user's interests
+        catalog.ensure_loaded(db)
+        overlaps = catalog.tag_overlap(user_interests)
+        content_ids = catalog.content_ids
         
-        self.cf_model.train(matrix)
-        return self.cf_model
+        candidates = (
+            (content_ids[pos], overlap / len(user_interests))
+            for pos, overlap in overlaps.items()
+            if content_ids[pos] not in user_interacted_items
+        )
+        return heapq.nlargest(n_recommendations, candidates, key=lambda x: x[1])
     
-    def generate_all_embeddings(self, db: Session):
-        """Generate embeddings for all content"""
-        all_content = get_all_content(db)
+    def generate_all_embeddings(self, db: Session, on_chunk: Callable[[EmbeddingProgress], None] = None):
+        """Generate embeddings for new or changed content, reusing stored vectors for the rest
+        Content is streamed from the database in chunks; each encoded chunk is written to the
+        database and the index as soon as it finishes (progress in self.embedding_progress,
+        also passed to on_chunk after every chunk). The index is only saved if its vectors changed.
+        Returns: number of items encoded
+        """
+        all_ids = get_content_pks(db)
+        progress = EmbeddingProgress(total=len(all_ids))
+        self.embedding_progress = progress
         
-        if not all_content:
+        if not all_ids:
+            progress.finish()
             return 0
         
-        content_texts = []
-        content_ids = []
+        model_name = Config.EMBEDDING_MODEL
+        indexed = set(self.vector_db.id_to_content_map)
+        catalog_ids = set(all_ids)
+        
+        # Without overlap with the current index (first run), fill a new index sized and
+        # trained for the whole catalog, swapped in at the end (see IndexBuilder for its
+        # memory bound). Otherwise upsert chunk by chunk, so the cost follows the churn.
+        build_once = not (indexed & catalog_ids)
+        if build_once:
+            builder = self.vector_db.start_build(len(all_ids))
+        # Vectors replacing indexed ones in HNSW, which can't update in place: applied in
+        # one rebuild at the end instead of one per chunk
+        deferred_pks, deferred_content_ids, deferred_vectors = [], [], []
+        
+        def store(pks: list, chunk_content_ids: list, embeddings):
+            if not pks:
+                return
+            if build_once:
+                builder.add(np.asarray(embeddings), chunk_content_ids, pks)
+            elif self.vector_db.index_type == INDEX_HNSW:
+                new = []
+                for i, pk in enumerate(pks):
+                    if pk in self.vector_db.id_to_content_map:
+                        deferred_pks.append(pk)
+                        deferred_content_ids.append(chunk_content_ids[i])
+                        deferred_vectors.append(embeddings[i])
+                    else:
+                        new.append(i)
+                if new:
+                    self.vector_db.add_vectors(np.asarray(embeddings)[new], [chunk_content_ids[i] for i in new],
+                                               [pks[i] for i in new])
+            else:
+                self.vector_db.add_vectors(np.asarray(embeddings), chunk_content_ids, pks)
+        
+        def stale_chunks():
+            for contents in iter_content_chunks(db, Config.EMBEDDING_CHUNK_SIZE):
+                fresh, stale = self._split_stale_content(contents, model_name)
+                progress.reused += len(fresh)
+                if not build_once:
+                    fresh = [entry for entry in fresh if entry[0] not in indexed]
+                store([pk for pk, _, _ in fresh], [content_id for _, content_id, _ in fresh],
+                      [embedding for _, _, embedding in fresh])
+                if stale:
+                    yield stale, [text for _, _, _, text, _ in stale]
         
-        for content in all_content:
+        pipeline = EmbeddingPipeline(self.embedding_manager)
+        for stale, embeddings in pipeline.map_chunks(stale_chunks()):
+            update_content_embeddings(db, [
+                (content, embedding, text_hash)
+                for (content, _, _, _, text_hash), embedding in zip(stale, embeddings)
+            ], model_name)
+            store([pk for _, pk, _, _, _ in stale], [content_id for _, _, content_id, _, _ in stale], embeddings)
+            progress.chunk_done(len(stale))
+            if on_chunk is not None:
+                on_chunk(progress)
+        
+        if build_once:
+            builder.finish()
+        else:
+            # Drop vectors of content deleted since the index was built
+            removed = list(indexed - catalog_ids)
+            self.vector_db.apply_changes(
+                np.asarray(deferred_vectors, dtype=np.float32).reshape(-1, self.vector_db.dimension),
+                deferred_content_ids, deferred_pks, removed
+            )
+        self.vector_db.save_index()
+        progress.finish()
+        
+        return progress.encoded
+    
+    def _split_stale_content(self, contents: list, model_name: str):
+        """Separate rows whose stored embedding still matches their text and model
+        Returns: (fresh [(pk, content_id, embedding)], stale [(content, pk, content_id, text, text hash)])
+        """
+        fresh, stale = [], []
+        for content in contents:
             text = self.embedding_manager.get_content_embedding_text({
                 'title': content.title,
                 'category': content.category,
                 'tags': json.loads(content.tags) if content.tags else [],
                 'description': content.description
             })
-            content_texts.append(text)
-            content_ids.append(content.content_id)
-        
-        # Generate embeddings
-        embeddings = self.embedding_manager.generate_embeddings_batch(content_texts)
-        
-        # Add to vector database
-        self.vector_db.add_vectors(embeddings, content_ids)
-        self.vector_db.save_index()
-        
-        return len(content_ids)
+            text_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+            if content.embedding_vector and content.embedding_hash == text_hash \
+                    and content.embedding_model == model_name:
+                fresh.append((content.id, content.content_id, decode_embedding(content.embedding_vector)))
+            else:
+                stale.append((content, content.id, content.content_id, text, text_hash))
+        return fresh, stale
\ No newline at end of file
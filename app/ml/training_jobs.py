@@ -0,0 +1,285 @@
+import json
+import multiprocessing
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Callable, List, Optional
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from app.config import Config
+from app.db import crud
+from app.models.database import SessionLocal
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+
+class TrainingJob:
+    """State of one training run, updated from the worker process as it progresses"""
+
+    def __init__(self, retrain_cf: bool, regenerate_embeddings: bool, materialize: bool = False):
+        self.job_id = uuid.uuid4().hex
+        self.retrain_cf = retrain_cf
+        self.regenerate_embeddings = regenerate_embeddings
+        self.materialize = materialize
+        self.status = JOB_QUEUED
+        self.phase = None
+        self.progress = {}  # latest progress counters of the running phase
+        self.phases = {}  # phase -> seconds
+        self.result = None
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+
+    @classmethod
+    def from_record(cls, row) -> "TrainingJob":
+        """A job as last saved to the training_jobs table, e.g. by another server process"""
+        job = cls(row.retrain_cf, row.regenerate_embeddings, row.materialize)
+        job.job_id = row.job_id
+        job.status = row.status
+        job.phase = row.phase
+        job.progress = json.loads(row.progress) if row.progress else {}
+        job.phases = json.loads(row.phases) if row.phases else {}
+        job.result = json.loads(row.result) if row.result else None
+        job.error = row.error
+        job.created_at = row.created_at
+        job.started_at = row.started_at
+        job.finished_at = row.finished_at
+        return job
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JOB_COMPLETED, JOB_FAILED)
+
+    def as_dict(self) -> dict:
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'phase': self.phase,
+            'progress': self.progress,
+            'phases': self.phases,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+# Set in each worker process by the pool initializer
+_progress_queue = None
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+
+def _report(job_id: str, **update):
+    _progress_queue.put((job_id, update))
+
+def _run_training_job(job_id: str, retrain_cf: bool, regenerate_embeddings: bool, materialize: bool = False) -> dict:
+    """Train in the worker process; artifacts go to disk and the database for the server to load"""
+    from app.ml.recommender import HybridRecommender, fit_cf_model
+
+    _report(job_id, status=JOB_RUNNING, started_at=datetime.utcnow())
+    phases = {}
+    embeddings_generated = 0
+    cf_trained = False
+    materialized = 0
+    recommender = None
+    db = SessionLocal()
+    try:
+        if regenerate_embeddings:
+            _report(job_id, phase='embeddings')
+            start = time.perf_counter()
+            recommender = HybridRecommender()
+            embeddings_generated = recommender.generate_all_embeddings(
+                db, on_chunk=lambda progress: _report(job_id, progress=progress.as_dict())
+            )
+            phases['embeddings'] = round(time.perf_counter() - start, 3)
+            _report(job_id, progress=recommender.embedding_progress.as_dict(), phases=dict(phases))
+
+        if retrain_cf:
+            _report(job_id, phase='train_cf')
+            start = time.perf_counter()
+            cf_model = fit_cf_model(db)
+            phases['train_cf'] = round(time.perf_counter() - start, 3)
+            _report(job_id, phases=dict(phases))
+
+            if cf_model:
+                _report(job_id, phase='save_cf')
+                start = time.perf_counter()
+                artifact_path = cf_model.save(Config.CF_MODEL_DIR, keep=Config.CF_MODELS_KEPT)
+                crud.save_cf_model(
+                    db,
+                    cf_model.get_model_metadata(),
+                    len(cf_model.user_map),
+                    len(cf_model.item_map),
+                    artifact_path=artifact_path
+                )
+                cf_trained = True
+                phases['save_cf'] = round(time.perf_counter() - start, 3)
+                _report(job_id, phases=dict(phases))
+
+        if materialize:
+            # Same artifacts the server swaps in, so the stored model versions match
+            _report(job_id, phase='materialize')
+            start = time.perf_counter()
+            recommender = recommender or HybridRecommender()
+            recommender.load_cf_model(db)
+            materialized = recommender.materialize_all(
+                db, on_progress=lambda done, total: _report(job_id, progress={'materialized': done, 'total': total})
+            )
+            phases['materialize'] = round(time.perf_counter() - start, 3)
+    finally:
+        db.close()
+
+    return {
+        'phases': phases,
+        'embeddings_generated': embeddings_generated,
+        'cf_model_trained': cf_trained,
+        'recommendations_materialized': materialized
+    }
+
+class TrainingJobManager:
+    """Run training jobs in a separate process pool and track their state by job ID
+    Every state change is also saved to the training_jobs table, so any server process can
+    report a job, not only the one that accepted it.
+    on_complete callbacks run in the parent with each successfully finished job, e.g. to
+    hot-swap the new artifacts into the serving engine.
+    """
+
+    def __init__(self, max_workers: int = None, max_jobs: int = 100,
+                 on_complete: List[Callable[[TrainingJob], None]] = None,
+                 session_factory: Callable[[], Session] = SessionLocal):
+        self.max_workers = max_workers or Config.TRAINING_WORKERS
+        self.max_jobs = max_jobs
+        self.on_complete = list(on_complete or [])
+        self.session_factory = session_factory
+        self._jobs = OrderedDict()  # job_id -> TrainingJob accepted by this process, oldest first
+        self._lock = threading.Lock()
+        self._persist_lock = threading.Lock()
+        self._executor = None
+        self._progress_queue = None
+
+    def submit(self, retrain_cf: bool = True, regenerate_embeddings: bool = False,
+               materialize: bool = False) -> TrainingJob:
+        job = TrainingJob(retrain_cf, regenerate_embeddings, materialize)
+        with self._lock:
+            self._ensure_executor()
+            self._jobs[job.job_id] = job
+            self._evict_finished()
+            future = self._executor.submit(
+                _run_training_job, job.job_id, retrain_cf, regenerate_embeddings, materialize
+            )
+        self._persist(job)
+        future.add_done_callback(lambda future: self._finish(job, future))
+        return job
+
+    def get(self, job_id: str) -> Optional[TrainingJob]:
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        db = self.session_factory()
+        try:
+            row = crud.get_training_job(db, job_id)
+            return TrainingJob.from_record(row) if row is not None else None
+        finally:
+            db.close()
+
+    def list_jobs(self) -> List[TrainingJob]:
+        """Recent jobs of every server process, newest first"""
+        with self._lock:
+            local = dict(self._jobs)
+        db = self.session_factory()
+        try:
+            rows = crud.get_training_jobs(db, self.max_jobs)
+        finally:
+            db.close()
+        jobs = {row.job_id: local.get(row.job_id) or TrainingJob.from_record(row) for row in rows}
+        jobs.update(local)  # in case a save failed
+        return sorted(jobs.values(), key=lambda job: job.created_at, reverse=True)[:self.max_jobs]
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._progress_queue.put(None)
+                self._executor = None
+
+    def _ensure_executor(self):
+        if self._executor is not None:
+            return
+        # spawn: the job imports torch/faiss itself instead of inheriting the server's state;
+        # one task per child (Python 3.11+) returns the training memory to the OS after every job
+        context = multiprocessing.get_context('spawn')
+        self._progress_queue = context.Queue()
+        recycle = {'max_tasks_per_child': 1} if sys.version_info >= (3, 11) else {}
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self._progress_queue,),
+            **recycle
+        )
+        threading.Thread(target=self._drain_progress, args=(self._progress_queue,),
+                         name="training-progress", daemon=True).start()
+
+    def _drain_progress(self, progress_queue):
+        while True:
+            message = progress_queue.get()
+            if message is None:
+                return
+            job_id, update = message
+            job = self._jobs.get(job_id)
+            # Updates can arrive after the result; never move a finished job backwards
+            if job is None or job.finished_at is not None:
+                continue
+            for key, value in update.items():
+                setattr(job, key, value)
+            self._persist(job)
+
+    def _finish(self, job: TrainingJob, future):
+        error = future.exception()
+        job.finished_at = datetime.utcnow()
+        job.phase = None
+        if error is not None:
+            job.error = f"{type(error).__name__}: {error}"
+            job.status = JOB_FAILED
+            self._persist(job)
+            return
+
+        result = future.result()
+        job.phases = result.pop('phases')
+        job.result = result
+        # Report completion only once the new models are serving
+        for callback in self.on_complete:
+            try:
+                callback(job)
+            except Exception as e:
+                job.error = f"Trained, but loading the new models failed: {type(e).__name__}: {e}"
+        job.status = JOB_COMPLETED
+        self._persist(job)
+
+    def _persist(self, job: TrainingJob):
+        # Serialized, so the last write always carries the job's latest state
+        with self._persist_lock:
+            db = self.session_factory()
+            try:
+                crud.save_training_job(db, job)
+            except SQLAlchemyError:
+                # This process still reports the job from memory; the next update retries
+                db.rollback()
+            finally:
+                db.close()
+
+    def _evict_finished(self):
+        # Forget the oldest finished jobs once more than max_jobs are tracked
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished]:
+            if len(self._jobs) <= self.max_jobs:
+                break
+            del self._jobs[job_id]
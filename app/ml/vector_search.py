@@ -1,76 +1,419 @@
 import faiss
 import numpy as np
+import json
+import math
 import os
+import shutil
+from datetime import datetime
 from app.config import Config
 
+# Index families, from exact search on small catalogs to compressed search on huge ones
+INDEX_FLAT = 'flat'
+INDEX_IVF = 'ivf'
+INDEX_HNSW = 'hnsw'
+INDEX_IVFPQ = 'ivfpq'
+
+HNSW_M = 32
+PQ_BITS = 8
+
+# Saved layout: <VECTOR_DB_PATH without extension>/<snapshot>/{index.faiss, ids.json}, with the
+# CURRENT file naming the live snapshot. Switching CURRENT is one atomic rename, so a reader
+# always gets an index and ID map written together. ids.json also carries the generation,
+# a counter bumped only by saves that changed the vectors.
+INDEX_FILE = 'index.faiss'
+IDS_FILE = 'ids.json'
+CURRENT_FILE = 'CURRENT'
+SAVED_SNAPSHOTS_KEPT = 3  # older snapshots stay readable for processes still loading them
+
+def read_current_snapshot(store_dir: str):
+    """Snapshot directory named by CURRENT, None when nothing has been saved in this layout"""
+    try:
+        with open(os.path.join(store_dir, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def choose_index_type(n_vectors: int, dimension: int) -> str:
+    """Pick the index family for a catalog of n_vectors within Config.FAISS_MEMORY_BUDGET_MB"""
+    budget = Config.FAISS_MEMORY_BUDGET_MB * 1024 * 1024
+    flat_bytes = n_vectors * dimension * 4
+    pq_trainable = n_vectors >= 2 ** PQ_BITS  # PQ training needs a point per codebook centroid
+    
+    if flat_bytes > budget and pq_trainable:
+        return INDEX_IVFPQ
+    if n_vectors < Config.FAISS_FLAT_MAX_VECTORS:
+        return INDEX_FLAT
+    if n_vectors < Config.FAISS_IVF_MAX_VECTORS:
+        return INDEX_IVF
+    if flat_bytes + n_vectors * HNSW_M * 2 * 4 <= budget or not pq_trainable:
+        return INDEX_HNSW
+    return INDEX_IVFPQ
+
+def build_index(index_type: str, n_vectors: int, dimension: int):
+    """Create an empty inner-product index of the given family, sized for n_vectors
+    Every family accepts add_with_ids() keyed by Content.id and can reconstruct vectors by ID.
+    """
+    if index_type == INDEX_FLAT:
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+    
+    if index_type == INDEX_HNSW:
+        hnsw = faiss.IndexHNSWFlat(dimension, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        hnsw.hnsw.efConstruction = 200
+        hnsw.hnsw.efSearch = Config.FAISS_EF_SEARCH
+        return faiss.IndexIDMap2(hnsw)
+    
+    # IVF stores the IDs itself (IndexIDMap2 over IVF breaks on remove_ids), the hashtable
+    # direct map makes upserts and reconstruct() by ID work
+    nlist = max(1, int(math.sqrt(n_vectors)))
+    quantizer = faiss.IndexFlatIP(dimension)
+    if index_type == INDEX_IVF:
+        index = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+    else:
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist, _pq_subquantizers(dimension),
+                                 PQ_BITS, faiss.METRIC_INNER_PRODUCT)
+    index.nprobe = Config.FAISS_NPROBE
+    index.set_direct_map_type(faiss.DirectMap.Hashtable)
+    return index
+
+def index_type_of(index) -> str:
+    if isinstance(index, faiss.IndexIVFPQ):
+        return INDEX_IVFPQ
+    if isinstance(index, faiss.IndexIVF):
+        return INDEX_IVF
+    if isinstance(index, faiss.IndexIDMap2) and isinstance(faiss.downcast_index(index.index), faiss.IndexHNSW):
+        return INDEX_HNSW
+    return INDEX_FLAT
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
+    """float32 copy with unit L2 norm rows, so inner product equals cosine similarity"""
+    vectors_f32 = np.array(vectors, dtype=np.float32)
+    faiss.normalize_L2(vectors_f32)
+    return vectors_f32
+
+def _pq_subquantizers(dimension: int) -> int:
+    # Largest divisor of the dimension giving sub-vectors of at least 8 dims
+    for m in range(dimension // 8, 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
 class VectorDatabase:
-    def __init__(self):
+    def __init__(self, mmap: bool = False):
         self.db_path = Config.VECTOR_DB_PATH
+        self.store_dir = os.path.splitext(self.db_path)[0]
         self.dimension = Config.FAISS_DIMENSION
         self.index = None
-        self.content_ids = []
-        self.id_to_content_map = {}
-        self.load_or_create_index()
+        self.index_type = None
+        self.mmapped = False
+        self.index_path = None  # file the index was read from
+        self.snapshot = None  # saved snapshot directory loaded or last written
+        self.id_to_content_map = {}  # Content.id -> content_id
+        self.generation = 0
+        self.version = None  # saved generation, the same in every process that loaded it
+        self.dirty = False  # vectors changed since the last load or save
+        self.load_or_create_index(mmap)
     
-    def load_or_create_index(self):
-        """Load existing index or create new one"""
-        if os.path.exists(self.db_path):
-            self.index = faiss.read_index(self.db_path)
+    def load_or_create_index(self, mmap: bool = False):
+        """Load existing index or create new one
+        mmap: map the stored index read-only so workers share its pages
+        """
+        snapshot = read_current_snapshot(self.store_dir)
+        legacy_ids_path = self.store_dir + '.ids.json'
+        if snapshot is not None:
+            index_path = os.path.join(self.store_dir, snapshot, INDEX_FILE)
+            ids_path = os.path.join(self.store_dir, snapshot, IDS_FILE)
+        elif os.path.exists(self.db_path) and os.path.exists(legacy_ids_path):
+            # Single-file layout written before versioned directories
+            index_path, ids_path = self.db_path, legacy_ids_path
         else:
-            # Create new IVF index for better performance on large datasets
-            quantizer = faiss.IndexFlatL2(self.dimension)
-            self.index = faiss.IndexIVFFlat(quantizer, self.dimension, 100)
-            self.index.nprobe = 10
+            index_path = None
+        
+        if index_path is not None:
+            if mmap:
+                self.index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP)
+                self.mmapped = True
+            else:
+                self.index = faiss.read_index(index_path)
+            with open(ids_path) as f:
+                saved = json.load(f)
+            if 'generation' not in saved:  # bare ID map written before generations
+                saved = {'generation': 0, 'ids': saved}
+            self.id_to_content_map = {int(pk): content_id for pk, content_id in saved['ids'].items()}
+            self.generation = saved['generation']
+            self.version = str(self.generation)
+            self.index_path = index_path
+            self.snapshot = snapshot
+        
+        # Indexes written before vectors were keyed by Content.id have no ID file, start over
+        if self.index is None:
+            self.index = build_index(INDEX_FLAT, 0, self.dimension)
+            self.mmapped = False
+            self.id_to_content_map = {}
+        self.index_type = index_type_of(self.index)
     
-    def add_vectors(self, vectors: np.ndarray, content_ids: list):
-        """Add vectors and their corresponding content IDs"""
+    def add_vectors(self, vectors: np.ndarray, content_ids: list, ids: list):
+        """Insert or replace vectors, keyed by Content.id
+        content_ids: matching content_id strings, ids: matching Content.id primary keys
+        """
         if vectors.shape[0] == 0:
             return
         
-        vectors_f32 = vectors.astype(np.float32)
+        vectors_f32 = _normalized(vectors)
+        ids_i64 = np.asarray(ids, dtype=np.int64)
+        replaced = [pk for pk in ids_i64.tolist() if pk in self.id_to_content_map]
+        new_total = len(self.id_to_content_map) + len(ids_i64) - len(replaced)
+        
+        # Rebuild when the catalog outgrows the current index family or IVF list count,
+        # or when vectors must be replaced in HNSW, which can't delete
+        if choose_index_type(new_total, self.dimension) != self.index_type or \
+                self._nlist_stale(new_total) or (replaced and self.index_type == INDEX_HNSW):
+            stored_ids, stored_vectors = self._stored_vectors(exclude=set(replaced))
+            self.rebuild(
+                np.vstack([stored_vectors, vectors_f32]),
+                [self.id_to_content_map[pk] for pk in stored_ids.tolist()] + list(content_ids),
+                np.concatenate([stored_ids, ids_i64])
+            )
+            return
+        
+        self._make_writable()
         
         # Train index if not trained
         if not self.index.is_trained:
             self.index.train(vectors_f32)
         
-        # Add vectors
-        start_idx = self.index.ntotal
-        self.index.add(vectors_f32)
+        # Upsert: drop any previous vectors for these IDs before adding
+        if replaced:
+            self.index.remove_ids(np.asarray(replaced, dtype=np.int64))
+        self.index.add_with_ids(vectors_f32, ids_i64)
+        
+        for pk, content_id in zip(ids_i64.tolist(), content_ids):
+            self.id_to_content_map[pk] = content_id
+        self.dirty = True
+    
+    def _nlist_stale(self, n_vectors: int) -> bool:
+        """IVF lists were sized for about nlist² vectors; far off that, recall or speed suffers"""
+        if self.index_type not in (INDEX_IVF, INDEX_IVFPQ):
+            return False
+        sized_for = self.index.nlist ** 2
+        return n_vectors > 4 * sized_for or n_vectors < sized_for / 4
+    
+    def remove_vectors(self, ids: list):
+        """Drop the vectors stored for these Content.id keys"""
+        removed = [int(pk) for pk in ids if int(pk) in self.id_to_content_map]
+        if not removed:
+            return
+        
+        # HNSW can't delete, rebuild it from the remaining vectors
+        if self.index_type == INDEX_HNSW:
+            stored_ids, stored_vectors = self._stored_vectors(exclude=set(removed))
+            self.rebuild(stored_vectors, [self.id_to_content_map[pk] for pk in stored_ids.tolist()], stored_ids)
+            return
+        
+        self._make_writable()
+        self.index.remove_ids(np.asarray(removed, dtype=np.int64))
+        for pk in removed:
+            del self.id_to_content_map[pk]
+        self.dirty = True
+    
+    def apply_changes(self, vectors: np.ndarray, content_ids: list, ids: list, removed_ids: list = ()):
+        """Upsert vectors and drop removed_ids as one change
+        HNSW can't delete, so replacing or removing there costs a single rebuild for the batch.
+        """
+        removed = [int(pk) for pk in removed_ids if int(pk) in self.id_to_content_map]
+        replaced = [int(pk) for pk in ids if int(pk) in self.id_to_content_map]
+        if self.index_type == INDEX_HNSW and (removed or replaced):
+            stored_ids, stored_vectors = self._stored_vectors(exclude=set(removed) | set(replaced))
+            self.rebuild(
+                np.vstack([stored_vectors, np.asarray(vectors, dtype=np.float32)]),
+                [self.id_to_content_map[pk] for pk in stored_ids.tolist()] + list(content_ids),
+                np.concatenate([stored_ids, np.asarray(ids, dtype=np.int64)])
+            )
+            return
+        self.add_vectors(vectors, content_ids, ids)
+        self.remove_vectors(removed)
+    
+    def _make_writable(self):
+        # Memory-mapped inverted lists are read-only, writes go to an in-memory copy
+        if self.mmapped:
+            self.index = faiss.read_index(self.index_path)
+            self.mmapped = False
+    
+    def rebuild(self, vectors: np.ndarray, content_ids: list, ids: list):
+        """Replace the whole index with exactly these vectors, choosing the index family by size"""
+        n_vectors = vectors.shape[0]
+        index_type = choose_index_type(n_vectors, self.dimension)
+        index = build_index(index_type, n_vectors, self.dimension)
+        vectors_f32 = _normalized(vectors)
+        if n_vectors > 0:
+            index.train(self._training_sample(vectors_f32, index))
+            index.add_with_ids(vectors_f32, np.asarray(ids, dtype=np.int64))
         
-        # Map indices to content IDs
-        for i, content_id in enumerate(content_ids):
-            self.id_to_content_map[start_idx + i] = content_id
+        # Swap in fully built state so concurrent searches never see a partial index
+        self.id_to_content_map = dict(zip((int(pk) for pk in ids), content_ids))
+        self.index = index
+        self.index_type = index_type
+        self.mmapped = False
+        self.dirty = True
+    
+    def start_build(self, n_vectors: int) -> "IndexBuilder":
+        """Build a replacement index chunk by chunk, e.g. while a whole catalog is encoded"""
+        return IndexBuilder(self, n_vectors)
+    
+    def _training_sample(self, vectors: np.ndarray, index) -> np.ndarray:
+        """IVF clustering only needs a few hundred points per list"""
+        if not isinstance(index, faiss.IndexIVF):
+            return vectors
+        n_sample = min(vectors.shape[0], 256 * index.nlist)
+        if n_sample == vectors.shape[0]:
+            return vectors
+        rng = np.random.default_rng(42)
+        return vectors[rng.choice(vectors.shape[0], n_sample, replace=False)]
     
-    def search_similar(self, query_vector: np.ndarray, k: int = 10) -> list:
+    def _stored_vectors(self, exclude: set = None):
+        """Reconstruct every stored vector
+        Returns: (ids, vectors)
+        """
+        ids = np.fromiter(
+            (pk for pk in self.id_to_content_map if not exclude or pk not in exclude), dtype=np.int64
+        )
+        if ids.shape[0] == 0:
+            return ids, np.zeros((0, self.dimension), dtype=np.float32)
+        return ids, self.index.reconstruct_batch(ids)
+    
+    def get_vectors(self, ids: list):
+        """Gather stored vectors by Content.id in one call
+        Returns: (found mask, vectors) with zero rows for IDs that aren't indexed
+        """
+        ids_i64 = np.asarray(ids, dtype=np.int64)
+        found = np.fromiter(
+            (pk in self.id_to_content_map for pk in ids_i64.tolist()), dtype=bool, count=ids_i64.shape[0]
+        )
+        vectors = np.zeros((ids_i64.shape[0], self.dimension), dtype=np.float32)
+        if found.any():
+            vectors[found] = self.index.reconstruct_batch(ids_i64[found])
+        return found, vectors
+    
+    def search_similar(self, query_vector: np.ndarray, k: int = 10,
+                       nprobe: int = None, ef_search: int = None) -> list:
         """Search for k most similar vectors
-        Returns: [(content_id, distance), ...]
+        nprobe (IVF) / ef_search (HNSW) trade recall for latency on this query only
+        Returns: [(content_id, cosine_similarity), ...]
         """
         if self.index.ntotal == 0:
             return []
         
-        query_f32 = query_vector.astype(np.float32).reshape(1, -1)
-        distances, indices = self.index.search(query_f32, k)
+        query_f32 = _normalized(query_vector.reshape(1, -1))
+        distances, indices = self.index.search(query_f32, k, params=self._search_params(nprobe, ef_search))
         
+        # Unit vectors in an inner-product index: scores are already cosine similarities
         results = []
-        for idx, distance in zip(indices[0], indices[0]):
+        for idx, similarity in zip(indices[0], distances[0]):
             if idx != -1:  # -1 means not found
-                content_id = self.id_to_content_map.get(idx, None)
+                content_id = self.id_to_content_map.get(int(idx), None)
                 if content_id:
-                    # Convert L2 distance to similarity score (0-1)
-                    similarity = 1 / (1 + distance)
                     results.append((content_id, float(similarity)))
         
         return results
     
+    def _search_params(self, nprobe: int = None, ef_search: int = None):
+        if self.index_type in (INDEX_IVF, INDEX_IVFPQ) and nprobe:
+            return faiss.SearchParametersIVF(nprobe=nprobe)
+        if self.index_type == INDEX_HNSW and ef_search:
+            return faiss.SearchParametersHNSW(efSearch=ef_search)
+        return None
+    
     def save_index(self):
-        """Save index to disk"""
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        faiss.write_index(self.index, self.db_path)
+        """Save index and its ID mapping as a new snapshot, then switch CURRENT to it atomically
+        Does nothing when the vectors haven't changed since they were loaded or last saved.
+        """
+        if not self.dirty:
+            return
+        generation = self.generation + 1
+        snapshot = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+        path = os.path.join(self.store_dir, snapshot)
+        tmp_path = os.path.join(self.store_dir, f'.{snapshot}.tmp')
+        os.makedirs(tmp_path)
+        faiss.write_index(self.index, os.path.join(tmp_path, INDEX_FILE))
+        with open(os.path.join(tmp_path, IDS_FILE), 'w') as f:
+            json.dump({'generation': generation, 'ids': self.id_to_content_map}, f)
+        os.rename(tmp_path, path)
+        
+        current_tmp = os.path.join(self.store_dir, f'.{CURRENT_FILE}.{os.getpid()}.tmp')
+        with open(current_tmp, 'w') as f:
+            f.write(snapshot)
+        os.replace(current_tmp, os.path.join(self.store_dir, CURRENT_FILE))
+        self.index_path = os.path.join(path, INDEX_FILE)
+        self.snapshot = snapshot
+        self.generation = generation
+        self.version = str(generation)
+        self.dirty = False
+        self._prune_snapshots()
+    
+    def _prune_snapshots(self):
+        snapshots = sorted(name for name in os.listdir(self.store_dir)
+                           if not name.startswith('.') and os.path.isdir(os.path.join(self.store_dir, name)))
+        for name in snapshots[:-SAVED_SNAPSHOTS_KEPT]:
+            shutil.rmtree(os.path.join(self.store_dir, name), ignore_errors=True)
     
     def get_index_stats(self) -> dict:
         """Get statistics about the index"""
         return {
             'total_vectors': self.index.ntotal,
             'dimension': self.dimension,
-            'is_trained': self.index.is_trained
+            'is_trained': self.index.is_trained,
+            'index_type': self.index_type
         }
+
+
+class IndexBuilder:
+    """A new index for about n_vectors vectors, filled by add() and swapped in by finish()
+    Vectors are added as they arrive instead of being gathered first. Peak memory is the
+    index being built plus, for IVF families, the first 256 * nlist vectors held back to
+    train on (the sample size rebuild() uses) plus the chunk being added.
+    Searches keep using the current index until finish().
+    """
+    
+    def __init__(self, vector_db: VectorDatabase, n_vectors: int):
+        self.vector_db = vector_db
+        self.index_type = choose_index_type(n_vectors, vector_db.dimension)
+        self.index = build_index(self.index_type, n_vectors, vector_db.dimension)
+        self.id_to_content_map = {}
+        self._train_size = min(n_vectors, 256 * self.index.nlist) if isinstance(self.index, faiss.IndexIVF) else 0
+        self._pending = []  # (vectors, ids) held until the index is trained
+        self._n_pending = 0
+    
+    def add(self, vectors: np.ndarray, content_ids: list, ids: list):
+        if vectors.shape[0] == 0:
+            return
+        vectors_f32 = _normalized(vectors)
+        ids_i64 = np.asarray(ids, dtype=np.int64)
+        for pk, content_id in zip(ids_i64.tolist(), content_ids):
+            self.id_to_content_map[pk] = content_id
+        if self.index.is_trained:
+            self.index.add_with_ids(vectors_f32, ids_i64)
+            return
+        self._pending.append((vectors_f32, ids_i64))
+        self._n_pending += vectors_f32.shape[0]
+        if self._n_pending >= self._train_size:
+            self.index.train(np.vstack([vectors for vectors, _ in self._pending]))
+            for pending_vectors, pending_ids in self._pending:
+                self.index.add_with_ids(pending_vectors, pending_ids)
+            self._pending = []
+    
+    def finish(self):
+        """Swap the built index into the database"""
+        vector_db = self.vector_db
+        if not self.index.is_trained:
+            # Fewer vectors arrived than the index was sized for, size it for what did
+            ids = np.concatenate([ids for _, ids in self._pending]) if self._pending else np.zeros(0, dtype=np.int64)
+            vector_db.rebuild(
+                np.vstack([vectors for vectors, _ in self._pending]) if self._pending
+                else np.zeros((0, vector_db.dimension), dtype=np.float32),
+                [self.id_to_content_map[pk] for pk in ids.tolist()], ids
+            )
+            return
+        vector_db.id_to_content_map = self.id_to_content_map
+        vector_db.index = self.index
+        vector_db.index_type = self.index_type
+        vector_db.mmapped = False
+        vector_db.dirty = True
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Text, ForeignKey, create_engine
+from sqlalchemy import Column, Integer, String, DateTime, Float, Text, LargeBinary, Boolean, ForeignKey, create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
@@ -31,7 +31,9 @@ class Content(Base):
     category = Column(String, index=True)
     tags = Column(Text)  # JSON string of tags
     description = Column(Text, nullable=True)
-    embedding_vector = Column(Text, nullable=True)  # JSON string of embedding vector
+    embedding_vector = Column(LargeBinary, nullable=True)  # Packed by app/db/embedding_codec.py
+    embedding_hash = Column(String, nullable=True)  # SHA-256 of the text the vector was encoded from
+    embedding_model = Column(String, nullable=True)  # Model that produced the vector
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -66,14 +68,44 @@ class CFModel(Base):
     __tablename__ = "cf_models"
     
     id = Column(Integer, primary_key=True, index=True)
-    model_data = Column(Text)  # JSON string of serialized CF model parameters
+    model_data = Column(Text)  # JSON string of model metadata (full factors in legacy rows)
+    artifact_path = Column(String, nullable=True)  # Directory written by CollaborativeFiltering.save
     trained_at = Column(DateTime, default=datetime.utcnow)
     n_users = Column(Integer)
     n_items = Column(Integer)
     rmse = Column(Float, nullable=True)
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+class MaterializedRecommendation(Base):
+    __tablename__ = "materialized_recommendations"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(String, ForeignKey("users.user_id"), unique=True, index=True)
+    recommendations = Column(Text)  # JSON list of [content_id, score, method]
+    n_recommendations = Column(Integer)  # Depth computed; serves any request for up to this many
+    model_version = Column(String)  # HybridRecommender.model_version the list was computed with
+    computed_at = Column(DateTime, default=datetime.utcnow)
+
+class TrainingJobRecord(Base):
+    __tablename__ = "training_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String, unique=True, index=True)
+    retrain_cf = Column(Boolean)
+    regenerate_embeddings = Column(Boolean)
+    materialize = Column(Boolean)
+    status = Column(String)  # queued, running, completed or failed
+    phase = Column(String, nullable=True)
+    progress = Column(Text)  # JSON counters of the running phase
+    phases = Column(Text)  # JSON phase -> seconds
+    result = Column(Text, nullable=True)  # JSON result once completed
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, index=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+def init_db():
+    """Create missing tables; run once at startup rather than on import"""
+    Base.metadata.create_all(bind=engine)
 
 def get_db():
     db = SessionLocal()
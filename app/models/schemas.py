@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 # User Schemas
@@ -36,12 +36,18 @@ class ContentResponse(BaseModel):
     category: str
     tags: List[str]
     description: Optional[str] = None
-    embedding_vector: Optional[List[float]] = None
+    embedding_vector: Optional[List[float]] = None  # Only filled when include_embedding=true
     created_at: datetime
 
     class Config:
         from_attributes = True
 
+class ContentEmbeddingResponse(BaseModel):
+    content_id: str
+    storage_format: str  # How the vector is stored: float32, float16 or int8
+    dimension: int
+    embedding: str  # Base64 of the little-endian float32 vector
+
 # Interaction Schemas
 class InteractionCreate(BaseModel):
     user_id: str
@@ -66,11 +72,28 @@ class RecommendationRequest(BaseModel):
     use_cf: bool = True  # Use collaborative filtering
     use_embeddings: bool = True  # Use embedding similarity
     cf_weight: float = 0.5  # Weight for CF vs embeddings
+    nprobe: Optional[int] = None  # IVF lists to probe, higher = better recall, slower
+    ef_search: Optional[int] = None  # HNSW search breadth, higher = better recall, slower
+    use_materialized: bool = True  # Allow the stored top-N when every other parameter is default
 
 class RecommendationResponse(BaseModel):
     user_id: str
     recommendations: List[dict]  # [{content_id, title, score, method}]
     timestamp: datetime
+    materialized: bool = False  # Served from the stored top-N
+    computed_at: Optional[datetime] = None  # When these recommendations were computed
+    staleness_seconds: float = 0.0  # timestamp - computed_at
+    cached: bool = False  # Served from the response cache
+
+class SimilarContentResponse(BaseModel):
+    content_id: str
+    similar: List[dict]  # [{content_id, title, category, score, method}]
+    timestamp: datetime
+
+class BatchRecommendationRequest(BaseModel):
+    user_ids: Optional[List[str]] = None  # None scores every user in the CF model
+    n_recommendations: int = 10
+    exclude_seen: bool = True  # Drop items each user already interacted with
 
 # Feedback Schemas
 class FeedbackRequest(BaseModel):
@@ -82,10 +105,21 @@ class FeedbackRequest(BaseModel):
 class TrainingRequest(BaseModel):
     retrain_cf: bool = True
     regenerate_embeddings: bool = False
+    materialize: bool = False  # Precompute every user's recommendations with the new models
 
-class TrainingResponse(BaseModel):
-    status: str
-    message: str
+class TrainingJobResult(BaseModel):
     embeddings_generated: int
     cf_model_trained: bool
-    timestamp: datetime
+    recommendations_materialized: int = 0
+
+class TrainingJobResponse(BaseModel):
+    job_id: str
+    status: str  # queued, running, completed or failed
+    phase: Optional[str] = None  # embeddings, train_cf, save_cf or materialize while running
+    progress: Dict = {}  # counters of the running phase
+    phases: Dict[str, float] = {}  # seconds spent per finished phase
+    result: Optional[TrainingJobResult] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
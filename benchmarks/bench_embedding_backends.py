@@ -0,0 +1,64 @@
+"""Per-text latency and batch throughput of each EmbeddingManager backend
+
+Usage: python benchmarks/bench_embedding_backends.py [--texts 1000] [--batch-size 64]
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.ml.embeddings import EmbeddingManager, EMBEDDING_BACKENDS
+
+WORDS = ["machine", "learning", "python", "recommendation", "systems", "neural", "networks",
+         "data", "science", "tutorial", "beginner", "advanced", "cooking", "travel", "music"]
+
+def generate_texts(n_texts, seed=42):
+    rng = np.random.default_rng(seed)
+    return [" ".join(rng.choice(WORDS, rng.integers(5, 30))) for _ in range(n_texts)]
+
+def single_text_latency(manager, texts, n_calls):
+    timings = []
+    for text in texts[:n_calls]:
+        start = time.perf_counter()
+        manager.generate_embedding(text)
+        timings.append(time.perf_counter() - start)
+    return np.percentile(timings, 50) * 1000, np.percentile(timings, 95) * 1000
+
+def batch_throughput(manager, texts, batch_size):
+    start = time.perf_counter()
+    embeddings = manager.generate_embeddings_batch(texts, batch_size=batch_size)
+    return len(texts) / (time.perf_counter() - start), embeddings
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--single-calls", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--backends", nargs="+", default=list(EMBEDDING_BACKENDS))
+    args = parser.parse_args()
+
+    texts = generate_texts(args.texts)
+    reference = None
+    for backend in args.backends:
+        try:
+            manager = EmbeddingManager(backend=backend)
+        except Exception as e:
+            print(f"{backend:10s}  unavailable: {e}")
+            continue
+
+        manager.generate_embeddings_batch(texts[:args.batch_size])  # warm-up
+        p50, p95 = single_text_latency(manager, texts, args.single_calls)
+        throughput, embeddings = batch_throughput(manager, texts, args.batch_size)
+
+        # Drift against the first backend (fp32 torch by default), embeddings are unit length
+        if reference is None:
+            reference = embeddings
+        min_cosine = float(np.min(np.sum(reference * embeddings, axis=1)))
+        print(f"{backend:10s}  single p50 {p50:7.2f}ms  p95 {p95:7.2f}ms  "
+              f"batch {throughput:8.1f} texts/s  dim {manager.dimension}  min cosine {min_cosine:.4f}")
+
+if __name__ == "__main__":
+    main()
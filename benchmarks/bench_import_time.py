@@ -0,0 +1,48 @@
+"""Cold import time, peak RSS and heavy modules loaded per entry point, each in a fresh interpreter
+
+Usage: python benchmarks/bench_import_time.py [--runs 5] [--modules app.main app.ml.recommender]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+HEAVY_MODULES = ["torch", "sentence_transformers", "faiss", "sklearn", "scipy"]
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": seconds,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy": [name for name in {heavy!r} if name in sys.modules]
+}}))
+"""
+
+def measure(module):
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modules", nargs="+", default=["app.main", "app.ml.recommender"])
+    args = parser.parse_args()
+
+    for module in args.modules:
+        samples = [measure(module) for _ in range(args.runs)]
+        seconds = statistics.median(sample["seconds"] for sample in samples)
+        rss_mb = statistics.median(sample["rss_mb"] for sample in samples)
+        heavy = ", ".join(samples[-1]["heavy"]) or "none"
+        print(f"{module:22s}  median {seconds:6.2f}s  peak RSS {rss_mb:7.1f} MB  heavy modules: {heavy}")
+
+if __name__ == "__main__":
+    main()
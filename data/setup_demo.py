@@ -58,13 +58,25 @@ def train_models():
             "regenerate_embeddings": True
         }
     )
-    if response.status_code == 200:
-        result = response.json()
+    if response.status_code != 202:
+        print(f"✗ Training failed: {response.text}")
+        return
+    
+    # Training runs in the background, poll the job until it finishes
+    job = response.json()
+    print(f"  Training job queued: {job['job_id']}")
+    while job["status"] in ("queued", "running"):
+        time.sleep(1)
+        job = requests.get(f"{BASE_URL}/training/jobs/{job['job_id']}").json()
+    
+    if job["status"] == "completed":
+        result = job["result"]
         print(f"✓ Training completed")
         print(f"  - Embeddings generated: {result['embeddings_generated']}")
         print(f"  - CF model trained: {result['cf_model_trained']}")
+        print(f"  - Phase timings (s): {job['phases']}")
     else:
-        print(f"✗ Training failed: {response.text}")
+        print(f"✗ Training failed: {job['error']}")
 
 def get_recommendations(user_id):
     """Get recommendations for a user"""
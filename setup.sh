@@ -49,7 +49,7 @@ fi
 # Initialize database
 echo ""
 echo "[6/6] Initializing database..."
-python -c "from app.models.database import Base, engine; Base.metadata.create_all(bind=engine)"
+python -c "from app.models.database import init_db; init_db()"
 echo "✓ Database initialized"
 
 echo ""
@@ -1,7 +1,7 @@
 import pytest
 import json
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 
 from app.main import app
@@ -68,6 +68,84 @@ def test_create_content():
     assert response.status_code == 200
     assert response.json()["content_id"] == "test_content"
 
+def test_content_catalog_tracks_new_content():
+    from app.db.catalog import catalog
+
+    db = TestingSessionLocal()
+    try:
+        catalog.load(db)
+        client.post(
+            "/content/",
+            json={
+                "content_id": "catalog_content",
+                "title": "Catalog Tutorial",
+                "category": "ml",
+                "tags": ["catalog", "test"]
+            }
+        )
+        entry = catalog.lookup(db, "catalog_content")
+        assert entry["title"] == "Catalog Tutorial"
+        assert entry["tags"] == ["catalog", "test"]
+        pos = catalog.positions["catalog_content"]
+        assert catalog.tag_overlap(["catalog", "test", "unknown"])[pos] == 2
+    finally:
+        db.close()
+
+def test_content_catalog_picks_up_rows_written_elsewhere():
+    from app.db.catalog import catalog
+    from app.models.database import Content
+
+    db = TestingSessionLocal()
+    try:
+        catalog.load(db)
+        # Another process inserting: no crud call, so no catalog.upsert in this one
+        db.add(Content(content_id="elsewhere_content", title="Elsewhere", category="ml",
+                       tags=json.dumps(["elsewhere"])))
+        db.commit()
+        assert catalog.get("elsewhere_content") is None
+        catalog.ensure_loaded(db)
+        assert catalog.get("elsewhere_content") is None  # no query once loaded
+        catalog.refresh(db)
+        pos = catalog.positions["elsewhere_content"]
+        assert catalog.tag_postings["elsewhere"] == [pos]
+
+        # Hydrating many IDs costs one refresh query, hits never go to the database
+        statements = []
+        listen = lambda *args: statements.append(args[2])
+        event.listen(engine, "before_cursor_execute", listen)
+        try:
+            entries = catalog.hydrate(db, ["elsewhere_content", "test_content", "catalog_content"] * 4)
+        finally:
+            event.remove(engine, "before_cursor_execute", listen)
+        assert len(statements) == 1 and all(entries)
+
+        # Unchanged tags leave the postings alone
+        postings = list(catalog.tag_postings["test"])
+        content = db.query(Content).filter(Content.content_id == catalog.content_ids[postings[0]]).first()
+        content.title = "Renamed"
+        catalog.upsert(content)
+        assert catalog.get(content.content_id)["title"] == "Renamed"
+        assert catalog.tag_postings["test"] == postings
+    finally:
+        db.close()
+
+def test_content_catalog_rows_are_readable_as_soon_as_they_are_visible():
+    from app.db.catalog import ContentCatalog
+
+    catalog = ContentCatalog()
+    seen = []
+
+    class ReadWhileAppending(list):
+        def append(self, value):
+            seen.append(catalog.get("mid_write"))  # a concurrent reader between column writes
+            super().append(value)
+
+    catalog.loaded = True
+    catalog.titles = ReadWhileAppending()
+    catalog._upsert_row(1, "mid_write", "Mid Write", "ml", json.dumps(["test"]))
+    assert seen == [None]
+    assert catalog.get("mid_write")["title"] == "Mid Write"
+
 def test_health_check():
     response = client.get("/health")
     assert response.status_code == 200
@@ -0,0 +1,788 @@
+import sys
+import threading
+import pytest
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.cache import SQLiteCache, make_cache
+from app.ml.batching import MicroBatcher
+from app.ml.fusion import ScoreFusion, normalize_scores
+from app.ml.training_jobs import TrainingJobManager
+from app.config import Config
+from app.ml.collaborative_filtering import CollaborativeFiltering, ALSCollaborativeFiltering
+from app.ml.vector_search import VectorDatabase, choose_index_type
+from app.ml.embeddings import EmbeddingManager, load_embedding_model
+from app.ml import recommender as recommender_module
+from app.db import crud
+from app.db.catalog import catalog
+from app.db.embedding_codec import encode_embedding, decode_embedding
+from app.models.database import Base
+from app.models.schemas import UserCreate, ContentCreate, InteractionCreate, RecommendationRequest
+from app.api.recommendations import _response_cache_key
+
+INTERACTIONS = [
+    ("alice", "ml101", "like"),
+    ("alice", "ml101", "click"),
+    ("alice", "py201", "view_time"),
+    ("bob", "py201", "skip"),
+    ("bob", "web101", "like"),
+    ("carol", "web101", "click"),
+]
+
+@pytest.fixture
+def db():
+    """Session on a fresh in-memory database; the process-wide catalog starts and ends empty"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    catalog.invalidate()
+    try:
+        yield session
+    finally:
+        session.close()
+        catalog.invalidate()
+
+def test_interaction_matrix_is_sparse_and_sums_duplicates():
+    cf = CollaborativeFiltering(n_factors=2)
+    matrix, user_map, item_map = cf.build_interaction_matrix(INTERACTIONS)
+
+    assert matrix.format == "csr"
+    assert matrix.shape == (3, 3)
+    assert matrix.nnz == 5
+    assert matrix[user_map["alice"], item_map["ml101"]] == 7.0
+    assert matrix[user_map["bob"], item_map["py201"]] == -1.0
+
+def test_nmf_trains_on_sparse_matrix_with_skips():
+    cf = CollaborativeFiltering(n_factors=2, n_epochs=50)
+    matrix, _, _ = cf.build_interaction_matrix(INTERACTIONS)
+    user_factors, item_factors = cf.train(matrix)
+
+    assert user_factors.shape == (3, 2)
+    assert item_factors.shape == (3, 2)
+    assert np.all(item_factors >= 0)
+
+def test_als_factors_fit_observed_preferences():
+    cf = ALSCollaborativeFiltering(n_factors=4, n_epochs=10, n_workers=2, block_size=2)
+    matrix, _, _ = cf.build_interaction_matrix(INTERACTIONS)
+    cf.train(matrix)
+
+    assert cf.user_factors.shape == (3, 4)
+    assert cf.predict_rating("alice", "ml101") > 0.9
+    assert abs(cf.predict_rating("bob", "py201")) < 0.1
+    assert cf.recommend_for_user("carol", 1) == [("web101", pytest.approx(1.0, abs=0.1))]
+
+def test_batch_recommendations_match_per_user_ranking():
+    rng = np.random.default_rng(0)
+    cf = CollaborativeFiltering()
+    cf.user_factors = rng.random((7, 4), dtype=np.float32)
+    cf.item_factors = rng.random((9, 4), dtype=np.float32)
+    cf.user_map = {f"u{u}": u for u in range(7)}
+    cf.item_map = {f"i{i}": i for i in range(9)}
+    cf.reverse_user_map = {u: user_id for user_id, u in cf.user_map.items()}
+    cf.reverse_item_map = {i: item_id for item_id, i in cf.item_map.items()}
+    seen_pairs = [("u0", "i0"), ("u0", "i3"), ("u5", "i8"), ("u5", "i8"), ("u5", "gone"), ("ghost", "i1")]
+    blocks = []
+
+    def block_seen_pairs(block_user_ids):
+        blocks.append(block_user_ids)
+        return [pair for pair in seen_pairs if pair[0] in block_user_ids or pair[0] == "ghost"]
+
+    # 4-byte scores x 9 items: a 40-byte cap forces single-user blocks
+    batch = list(cf.recommend_batch(["u0", "nobody", "u5"] + [f"u{u}" for u in range(7)], 3,
+                                    seen_pairs=block_seen_pairs, max_block_bytes=40))
+
+    assert blocks[:2] == [["u0"], ["u5"]]  # pairs are fetched per block, only for known users
+    assert [user_id for user_id, _ in batch][:3] == ["u0", "nobody", "u5"]
+    # A user repeated within one block is masked in every row
+    repeated = cf.recommend_batch(["u5", "u0", "u5"], 3, seen_pairs=block_seen_pairs)
+    assert [[item_id for item_id, _ in recs] for _, recs in repeated] == [
+        [item_id for item_id, _ in batch[pos][1]] for pos in (2, 0, 2)
+    ]
+    assert batch[1] == ("nobody", [])
+    seen = {"u0": {"i0", "i3"}, "u5": {"i8"}}
+    scores = cf.user_factors[0] @ cf.item_factors.T
+    reference = sorted((item_id for item_id in cf.item_map if item_id not in seen["u0"]),
+                       key=lambda item_id: -scores[cf.item_map[item_id]])[:3]
+    assert [item_id for item_id, _ in cf.recommend_for_user("u0", 3, seen["u0"] | {"unknown"})] == reference
+    for user_id, recs in batch[2:]:
+        expected = cf.recommend_for_user(user_id, 3, seen.get(user_id, set()))
+        assert [item_id for item_id, _ in recs] == [item_id for item_id, _ in expected]
+        assert [score for _, score in recs] == pytest.approx([score for _, score in expected], rel=1e-5)
+
+def test_batch_recommendations_read_seen_items_through_their_own_session(db):
+    from app.ml.batch_recommend import batch_recommendations
+    for user_id, content_id, interaction_type in INTERACTIONS:
+        crud.create_interaction(db, InteractionCreate(user_id=user_id, content_id=content_id,
+                                                      interaction_type=interaction_type))
+    cf = CollaborativeFiltering(n_factors=2)
+    cf.train(cf.build_interaction_matrix(INTERACTIONS)[0])
+    sessions = []
+
+    def session_factory():
+        sessions.append(sessionmaker(bind=db.get_bind())())
+        return sessions[-1]
+
+    records = batch_recommendations(cf, ["alice", "carol"], 5, session_factory=session_factory)
+    assert sessions == []  # nothing is read until the records are consumed
+    records = list(records)
+    assert len(sessions) == 1 and not sessions[0].in_transaction()  # closed when exhausted
+    seen = {(user_id, content_id) for user_id, content_id, _ in INTERACTIONS}
+    assert [record["user_id"] for record in records] == ["alice", "carol"]
+    for record in records:
+        assert all((record["user_id"], rec["content_id"]) not in seen for rec in record["recommendations"])
+
+def test_similar_users_and_items_rank_by_cosine_and_follow_fold_ins():
+    cf = CollaborativeFiltering(n_factors=2)
+    cf.user_factors = np.array([[1.0, 0.0], [2.0, 0.1], [0.0, 1.0], [0.0, 0.0]])
+    cf.item_factors = np.array([[1.0, 1.0], [3.0, 3.1], [1.0, 0.0]])
+    cf.user_map = {"a": 0, "b": 1, "c": 2, "d": 3}
+    cf.item_map = {"i0": 0, "i1": 1, "i2": 2}
+    cf.reverse_user_map = {idx: user_id for user_id, idx in cf.user_map.items()}
+    cf.reverse_item_map = {idx: item_id for item_id, idx in cf.item_map.items()}
+
+    similar = cf.find_similar_users("a", 3)
+    assert similar[0] == ("b", pytest.approx(2 / np.hypot(2, 0.1)))
+    assert dict(similar[1:]) == {"c": 0.0, "d": 0.0}  # orthogonal, and a zero vector
+    assert [item_id for item_id, _ in cf.find_similar_items("i0", 1)] == ["i1"]
+
+    # A folded-in item is immediately searchable
+    cf.fold_in_item("i3", [("a", "like"), ("b", "like")])
+    assert cf.find_similar_items("i2", 1)[0][0] == "i3"
+    assert cf.find_similar_items("missing") == []
+
+def test_fold_in_new_user_and_item_without_retraining():
+    cf = ALSCollaborativeFiltering(n_factors=4, n_epochs=10, block_size=2)
+    matrix, _, _ = cf.build_interaction_matrix(INTERACTIONS)
+    cf.train(matrix)
+
+    assert cf.fold_in_user("dave", [("web101", "like")])
+    assert cf.user_factors.shape[0] == 4
+    assert cf.predict_rating("dave", "web101") == pytest.approx(cf.predict_rating("bob", "web101"), abs=0.1)
+
+    assert cf.fold_in_item("ds101", [("alice", "like"), ("dave", "skip")])
+    assert cf.reverse_item_map[cf.item_map["ds101"]] == "ds101"
+    assert cf.predict_rating("alice", "ds101") > cf.predict_rating("dave", "ds101")
+
+    # Unknown items give nothing to project against
+    assert not cf.fold_in_user("erin", [("unknown", "like")])
+    assert "erin" not in cf.user_map
+
+def test_recommend_during_concurrent_item_fold_ins():
+    cf = CollaborativeFiltering(n_factors=2)
+    cf.user_factors = np.array([[1.0, 0.5]])
+    cf.item_factors = np.array([[1.0, 0.0], [0.0, 1.0]])
+    cf.user_map, cf.reverse_user_map = {"u0": 0}, {0: "u0"}
+    cf.item_map, cf.reverse_item_map = {"i0": 0, "i1": 1}, {0: "i0", 1: "i1"}
+    cf.find_similar_items("i0", 1)  # fold-ins now also maintain the normalized rows
+    errors = []
+
+    def recommend():
+        while not done.is_set():
+            try:
+                cf.recommend_for_user("u0", 3)
+            except Exception as e:
+                errors.append(e)
+
+    done = threading.Event()
+    reader = threading.Thread(target=recommend)
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads often enough to land inside a fold-in
+    reader.start()
+    try:
+        for i in range(10000):
+            cf.fold_in_item(f"new{i}", [("u0", "like")])
+    finally:
+        done.set()
+        reader.join()
+        sys.setswitchinterval(switch_interval)
+    assert errors == []
+
+def test_similar_lookups_see_consistent_state_mid_fold_in():
+    class ReadDuringFoldIn(CollaborativeFiltering):
+        """Runs similarity lookups the moment a fold-in publishes its normalized row,
+        as a concurrent request could"""
+        def _update_unit_row(self, side, idx, vector):
+            super()._update_unit_row(side, idx, vector)
+            self.lookups.append((self.find_similar_users("u0", 5), self.find_similar_items("i0", 5)))
+
+    cf = ReadDuringFoldIn(n_factors=2)
+    cf.lookups = []
+    cf.user_factors = np.array([[1.0, 0.5], [0.5, 1.0]])
+    cf.item_factors = np.array([[1.0, 0.0], [0.0, 1.0]])
+    cf.user_map, cf.reverse_user_map = {"u0": 0, "u1": 1}, {0: "u0", 1: "u1"}
+    cf.item_map, cf.reverse_item_map = {"i0": 0, "i1": 1}, {0: "i0", 1: "i1"}
+    cf.find_similar_users("u0", 1)
+    cf.find_similar_items("i0", 1)
+
+    assert cf.fold_in_user("u2", [("i0", "like")])
+    assert cf.fold_in_item("i2", [("u0", "like")])
+    users, items = cf.lookups[-1]
+    assert "u2" in dict(users) and "i2" in dict(items)
+
+def test_saved_model_round_trips_through_memory_mapped_artifact(tmp_path):
+    cf = CollaborativeFiltering(n_factors=2, n_epochs=50)
+    matrix, _, _ = cf.build_interaction_matrix(INTERACTIONS)
+    cf.train(matrix)
+    path = cf.save(str(tmp_path))
+
+    loaded = CollaborativeFiltering()
+    loaded.load(path)
+
+    assert isinstance(loaded.user_factors, np.memmap)
+    assert loaded.user_factors.dtype == np.float32
+    assert loaded.item_map == cf.item_map
+    assert loaded.recommend_for_user("bob", 2) == pytest.approx(cf.recommend_for_user("bob", 2), rel=1e-5)
+
+    # Fold-ins on a mapped model stay in memory and never touch the artifact
+    assert loaded.fold_in_user("alice", [("web101", "like")])
+    assert np.load(f"{path}/user_factors.npy")[loaded.user_map["alice"]] == pytest.approx(
+        cf.user_factors[cf.user_map["alice"]], rel=1e-5
+    )
+
+def test_first_row_added_to_mapped_factors_copies_with_little_spare(tmp_path):
+    np.save(tmp_path / "factors.npy", np.ones((160, 4), dtype=np.float32))
+    mapped = np.load(tmp_path / "factors.npy", mmap_mode="c")
+    cf = CollaborativeFiltering()
+
+    factors, buffer = cf._with_row(mapped, None, 160, np.zeros(4, dtype=np.float32))
+    assert factors.shape == (161, 4) and buffer.shape == (180, 4)  # 1/8 spare, not 2x
+    factors, buffer = cf._with_row(factors, buffer, 161, np.zeros(4, dtype=np.float32))
+    assert buffer.shape == (180, 4) and factors.base is buffer
+
+def test_latest_model_loads_as_its_saved_algorithm_and_old_versions_are_pruned(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "CF_ALGORITHM", "nmf")
+    cf = ALSCollaborativeFiltering(n_factors=2, n_epochs=2, regularization=0.5, alpha=2.0, n_workers=1)
+    cf.train(cf.build_interaction_matrix(INTERACTIONS)[0])
+    for _ in range(4):
+        path = cf.save(str(tmp_path), keep=2)
+        crud.save_cf_model(db, cf.get_model_metadata(), len(cf.user_map), len(cf.item_map), artifact_path=path)
+
+    assert len(list(tmp_path.iterdir())) == 2 and (tmp_path / cf.version).is_dir()
+    loaded = recommender_module.load_latest_cf_model(db)
+    assert isinstance(loaded, ALSCollaborativeFiltering)
+    assert (loaded.regularization, loaded.alpha, loaded.version) == (0.5, 2.0, cf.version)
+
+def test_vector_ids_survive_restart_and_upserts_do_not_grow_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "VECTOR_DB_PATH", str(tmp_path / "embeddings.faiss"))
+    rng = np.random.default_rng(0)
+    vectors = rng.random((200, Config.FAISS_DIMENSION), dtype=np.float32)
+    ids = list(range(1, 201))
+    content_ids = [f"c{pk}" for pk in ids]
+
+    vector_db = VectorDatabase()
+    vector_db.rebuild(vectors, content_ids, ids)
+    vector_db.add_vectors(vectors[:50], content_ids[:50], ids[:50])
+    assert vector_db.index.ntotal == 200
+    vector_db.save_index()
+
+    restarted = VectorDatabase(mmap=True)
+    assert restarted.index.ntotal == 200
+    assert restarted.id_to_content_map[7] == "c7"
+    assert all(content_id.startswith("c") for content_id, _ in restarted.search_similar(vectors[6], 5))
+    unit_vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    assert restarted.index.reconstruct(120) == pytest.approx(unit_vectors[119], abs=1e-6)
+    assert restarted.index.reconstruct(20) == pytest.approx(unit_vectors[19], abs=1e-6)
+
+def test_vector_index_saves_switch_snapshots_atomically(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "VECTOR_DB_PATH", str(tmp_path / "embeddings.faiss"))
+    rng = np.random.default_rng(0)
+    vectors = rng.random((12, Config.FAISS_DIMENSION), dtype=np.float32)
+
+    vector_db = VectorDatabase()
+    vector_db.rebuild(vectors[:4], ["c0", "c1", "c2", "c3"], [0, 1, 2, 3])
+    vector_db.save_index()
+    first = vector_db.snapshot
+    for pk in range(4, 12):
+        vector_db.add_vectors(vectors[pk:pk + 1], [f"c{pk}"], [pk])
+        vector_db.save_index()
+
+    store = tmp_path / "embeddings"
+    assert (store / "CURRENT").read_text() == vector_db.snapshot != first
+    snapshots = sorted(p.name for p in store.iterdir() if p.is_dir())
+    assert len(snapshots) == 3 and snapshots[-1] == vector_db.snapshot and first not in snapshots
+    assert sorted(p.name for p in store.iterdir()) == sorted(snapshots + ["CURRENT"])  # no temporaries left
+    assert sorted(p.name for p in (store / vector_db.snapshot).iterdir()) == ["ids.json", "index.faiss"]
+
+    restarted = VectorDatabase(mmap=True)
+    assert restarted.snapshot == vector_db.snapshot and restarted.version == vector_db.version == "9"
+    assert restarted.index.ntotal == 12 and restarted.id_to_content_map[11] == "c11"
+
+def test_vector_index_family_follows_catalog_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "VECTOR_DB_PATH", str(tmp_path / "embeddings.faiss"))
+    monkeypatch.setattr(Config, "FAISS_FLAT_MAX_VECTORS", 100)
+    monkeypatch.setattr(Config, "FAISS_IVF_MAX_VECTORS", 300)
+    rng = np.random.default_rng(0)
+    vectors = rng.random((400, Config.FAISS_DIMENSION), dtype=np.float32)
+    ids = list(range(1, 401))
+    content_ids = [f"c{pk}" for pk in ids]
+
+    vector_db = VectorDatabase()
+    vector_db.rebuild(vectors[:8], content_ids[:8], ids[:8])
+    assert vector_db.index_type == "flat"
+
+    vector_db.add_vectors(vectors[8:200], content_ids[8:200], ids[8:200])
+    assert vector_db.index_type == "ivf"
+    assert vector_db.index.nlist == 14
+
+    vector_db.add_vectors(vectors[200:], content_ids[200:], ids[200:])
+    assert vector_db.index_type == "hnsw"
+    vector_db.add_vectors(vectors[:10], content_ids[:10], ids[:10])
+    assert vector_db.index.ntotal == 400
+
+    assert vector_db.search_similar(vectors[42], 1, ef_search=128)[0][0] in vector_db.id_to_content_map.values()
+
+def test_ivf_lists_are_resized_as_the_catalog_drifts(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "VECTOR_DB_PATH", str(tmp_path / "embeddings.faiss"))
+    monkeypatch.setattr(Config, "FAISS_FLAT_MAX_VECTORS", 10)
+    rng = np.random.default_rng(0)
+    vectors = rng.random((80, Config.FAISS_DIMENSION), dtype=np.float32)
+    ids = list(range(80))
+    content_ids = [f"c{pk}" for pk in ids]
+
+    vector_db = VectorDatabase()
+    vector_db.rebuild(vectors[:16], content_ids[:16], ids[:16])
+    assert (vector_db.index_type, vector_db.index.nlist) == ("ivf", 4)
+    vector_db.add_vectors(vectors[16:64], content_ids[16:64], ids[16:64])
+    assert vector_db.index.nlist == 4  # within 4x of nlist²
+    vector_db.add_vectors(vectors[64:], content_ids[64:], ids[64:])
+    assert vector_db.index.nlist == 8 and vector_db.index.ntotal == 80
+
+def test_pq_is_only_chosen_with_enough_vectors_to_train(monkeypatch):
+    monkeypatch.setattr(Config, "FAISS_MEMORY_BUDGET_MB", 0)
+    monkeypatch.setattr(Config, "FAISS_FLAT_MAX_VECTORS", 100)
+    assert choose_index_type(50, Config.FAISS_DIMENSION) == "flat"
+    assert choose_index_type(255, Config.FAISS_DIMENSION) == "ivf"
+    assert choose_index_type(256, Config.FAISS_DIMENSION) == "ivfpq"
+
+def test_index_builder_adds_chunks_as_they_arrive(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "VECTOR_DB_PATH", str(tmp_path / "embeddings.faiss"))
+    monkeypatch.setattr(Config, "FAISS_FLAT_MAX_VECTORS", 10)
+    rng = np.random.default_rng(0)
+    vectors = rng.random((100, Config.FAISS_DIMENSION), dtype=np.float32)
+
+    vector_db = VectorDatabase()
+    builder = vector_db.start_build(100)
+    for start in range(0, 100, 25):
+        builder.add(vectors[start:start + 25], [f"c{pk}" for pk in range(start, start + 25)],
+                    list(range(start, start + 25)))
+        assert vector_db.index.ntotal == 0  # searches use the old index until finish()
+    assert builder.index.is_trained and builder._pending == []
+    builder.finish()
+    assert (vector_db.index_type, vector_db.index.ntotal, vector_db.dirty) == ("ivf", 100, True)
+    assert vector_db.search_similar(vectors[42], 1, nprobe=10)[0][0] == "c42"
+
+    # Fewer vectors than announced: the index is sized for what arrived
+    builder = vector_db.start_build(100)
+    builder.add(vectors[:5], [f"c{pk}" for pk in range(5)], list(range(5)))
+    builder.finish()
+    assert (vector_db.index_type, vector_db.index.ntotal) == ("flat", 5)
+
+def test_search_returns_cosine_similarity(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "VECTOR_DB_PATH", str(tmp_path / "embeddings.faiss"))
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(20, Config.FAISS_DIMENSION)).astype(np.float32)
+
+    vector_db = VectorDatabase()
+    vector_db.rebuild(vectors, [f"c{pk}" for pk in range(20)], list(range(20)))
+    results = vector_db.search_similar(vectors[3] * 10, 2)
+
+    assert results[0] == ("c3", pytest.approx(1.0, abs=1e-5))
+    other = int(results[1][0][1:])
+    expected = vectors[3] @ vectors[other] / (np.linalg.norm(vectors[3]) * np.linalg.norm(vectors[other]))
+    assert results[1][1] == pytest.approx(expected, abs=1e-5)
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_lru_cache_evicts_expires_and_counts(backend, tmp_path):
+    cache = make_cache(backend, maxsize=2, ttl=60, path=str(tmp_path / "cache.sqlite"))
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # evicts "b", the least recently used
+
+    assert cache.get("b") is None
+    assert cache.pop("a") == 1
+    assert cache.stats() == {"size": 1, "maxsize": 2, "hits": 1, "misses": 1, "hit_ratio": 0.5}
+
+    expired = make_cache(backend, maxsize=2, ttl=-1, path=str(tmp_path / "expired.sqlite"))
+    expired.set("a", 1)
+    assert expired.get("a") is None
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    writer = SQLiteCache(str(tmp_path / "cache.sqlite"), maxsize=10, ttl=60)
+    reader = SQLiteCache(str(tmp_path / "cache.sqlite"), maxsize=10, ttl=60)
+    writer.set("key", {"recommendations": [{"content_id": "c1", "score": 0.5}]})
+    assert reader.get("key") == {"recommendations": [{"content_id": "c1", "score": 0.5}]}
+    assert (reader.stats()["hit_ratio"], writer.stats()["hits"]) == (1.0, 0)
+
+def test_sqlite_cache_hits_do_not_write_and_errors_are_misses(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite"), maxsize=64, ttl=60)
+    cache.set("key", 1)
+    writes = cache._conn.total_changes
+    assert [cache.get("key") for _ in range(3)] == [1, 1, 1]
+    assert cache._conn.total_changes == writes
+
+    cache._conn.close()
+    cache.set("other", 2)
+    assert cache.get("key", "default") == "default"
+    assert (cache.hits, cache.misses) == (3, 1)
+
+def test_response_cache_key_tracks_request_models_and_user_activity(db):
+    user = crud.create_user(db, UserCreate(user_id="u1", interests=["ml"], skill_level="beginner"))
+    crud.create_content(db, ContentCreate(content_id="c1", title="C1", category="ml", tags=["ml"]))
+    req = RecommendationRequest(user_id="u1")
+
+    key = _response_cache_key(req, user, "v1", db)
+    assert _response_cache_key(RecommendationRequest(user_id="u1"), user, "v1", db) == key
+    assert _response_cache_key(RecommendationRequest(user_id="u1", cf_weight=0.7), user, "v1", db) != key
+    assert _response_cache_key(req, user, "v2", db) != key
+
+    crud.create_interaction(db, InteractionCreate(user_id="u1", content_id="c1", interaction_type="click"))
+    assert _response_cache_key(req, user, "v1", db) != key
+
+def test_score_normalizations():
+    scores = np.array([2.0, -1.0, 5.0, 2.0])
+    assert normalize_scores(scores, "minmax") == pytest.approx([0.5, 0.0, 1.0, 0.5])
+    zscores = normalize_scores(scores, "zscore")
+    assert (zscores.mean(), zscores.std()) == pytest.approx((0.0, 1.0))
+    assert normalize_scores(scores, "rank") == pytest.approx([0.75, 0.25, 1.0, 0.5])
+    with pytest.raises(ValueError):
+        ScoreFusion("softmax")
+
+def test_score_fusion_matches_weighted_sum_of_normalized_sources():
+    rng = np.random.default_rng(0)
+    embedding_recs = [(f"c{i}", float(score)) for i, score in enumerate(rng.random(30))]
+    cf_recs = [(f"c{i + 15}", float(score)) for i, score in enumerate(rng.normal(size=30))]
+
+    fusion = ScoreFusion("minmax")
+    fusion.add(embedding_recs, weight=0.3, normalize=False)
+    fusion.add(cf_recs, weight=0.7)
+    assert len(fusion) == 45
+
+    cf_scores = np.array([score for _, score in cf_recs])
+    expected = {content_id: 0.3 * score for content_id, score in embedding_recs}
+    for content_id, score in cf_recs:
+        normalized = (score - cf_scores.min()) / (cf_scores.max() - cf_scores.min() + 1e-10)
+        expected[content_id] = expected.get(content_id, 0) + 0.7 * normalized
+    ranked = sorted(expected.items(), key=lambda x: x[1], reverse=True)[:10]
+
+    top = fusion.top_k(10)
+    assert [content_id for content_id, _ in top] == [content_id for content_id, _ in ranked]
+    assert [score for _, score in top] == pytest.approx([score for _, score in ranked])
+
+    # Ties keep first-added order
+    tied = ScoreFusion()
+    tied.add([("a", 0.5), ("b", 0.5), ("c", 0.9)], normalize=False)
+    assert tied.top_k(5) == [("c", 0.9), ("a", 0.5), ("b", 0.5)]
+
+def test_embedding_codec_round_trips_each_storage_format():
+    embedding = np.random.default_rng(0).normal(size=Config.FAISS_DIMENSION).astype(np.float32)
+
+    blob = encode_embedding(embedding, "float32")
+    assert len(blob) == 2 + 4 * Config.FAISS_DIMENSION
+    assert np.array_equal(decode_embedding(blob), embedding)
+
+    half = decode_embedding(encode_embedding(embedding, "float16"))
+    assert np.allclose(half, embedding, atol=1e-2)
+
+    blob = encode_embedding(embedding, "int8")
+    assert len(blob) == 2 + 4 + Config.FAISS_DIMENSION
+    quantized = decode_embedding(blob)
+    cosine = quantized @ embedding / (np.linalg.norm(quantized) * np.linalg.norm(embedding))
+    assert cosine > 0.999
+
+def test_micro_batcher_coalesces_concurrent_encodes():
+    release = threading.Event()
+    batches = []
+
+    def encode_batch(texts):
+        release.wait(5)
+        batches.append(list(texts))
+        return np.array([[len(text)] for text in texts], dtype=np.float32)
+
+    batcher = MicroBatcher(encode_batch, max_batch_size=4, max_wait_ms=50)
+    first = batcher.submit("a")  # occupies the worker until released
+    while batcher.stats()["queue_depth"]:
+        pass
+    futures = [batcher.submit("x" * n) for n in range(1, 7)]
+    release.set()
+
+    assert first.result(5)[0] == 1
+    assert [future.result(5)[0] for future in futures] == [1, 2, 3, 4, 5, 6]
+    assert [len(batch) for batch in batches] == [1, 4, 2]
+    stats = batcher.stats()
+    assert stats["batches"] == 3 and stats["items"] == 7
+    assert stats["batch_size_histogram"] == {"1": 1, "3-4": 1, "2": 1}
+    batcher.close()
+
+@pytest.fixture(scope="module")
+def fp32_embedding_manager():
+    try:
+        return EmbeddingManager(backend="torch")
+    except Exception as e:
+        pytest.skip(f"embedding model unavailable: {e}")
+
+@pytest.mark.parametrize("backend", ["torch-int8", "onnx"])
+def test_embedding_backends_stay_close_to_fp32(fp32_embedding_manager, backend):
+    if backend == "onnx":
+        pytest.importorskip("onnxruntime")
+        pytest.importorskip("optimum")
+    manager = EmbeddingManager(backend=backend)
+    texts = ["Python for beginners", "Neural networks explained", "Italian cooking at home"]
+
+    reference = fp32_embedding_manager.generate_embeddings_batch(texts)
+    embeddings = manager.generate_embeddings_batch(texts)
+
+    assert manager.dimension == fp32_embedding_manager.dimension
+    assert np.min(np.sum(reference * embeddings, axis=1)) > 0.98
+
+def test_unknown_embedding_backend_is_rejected():
+    with pytest.raises(ValueError):
+        load_embedding_model(Config.EMBEDDING_MODEL, "tensorrt")
+
+class FakeEmbeddingManager(EmbeddingManager):
+    """Stands in for the sentence-transformer model, which tests can't download"""
+
+    def __init__(self):
+        self.dimension = Config.FAISS_DIMENSION
+        self.encoded_texts = []
+
+    def generate_embeddings_batch(self, texts: list, batch_size: int = None) -> np.ndarray:
+        self.encoded_texts.extend(texts)
+        return np.stack([
+            np.random.default_rng(abs(hash(text)) % 2**32).normal(size=self.dimension) for text in texts
+        ]).astype(np.float32)
+
+@pytest.fixture
+def recommender(tmp_path, monkeypatch):
+    """HybridRecommender with a fake embedding model and its vector index under tmp_path"""
+    monkeypatch.setattr(Config, "VECTOR_DB_PATH", str(tmp_path / "embeddings.faiss"))
+    monkeypatch.setattr(recommender_module, "EmbeddingManager", FakeEmbeddingManager)
+    recommender = recommender_module.HybridRecommender()
+    try:
+        yield recommender
+    finally:
+        recommender.embedding_batcher.close()
+
+def test_history_profile_incremental_update_matches_rebuild(db, recommender):
+    crud.create_user(db, UserCreate(user_id="u1", interests=["ml"], skill_level="beginner"))
+    contents = [
+        crud.create_content(db, ContentCreate(content_id=f"c{i}", title=f"C{i}", category="ml", tags=["ml"]))
+        for i in range(3)
+    ]
+    catalog.load(db)
+
+    rng = np.random.default_rng(0)
+    recommender.vector_db.rebuild(
+        rng.normal(size=(3, Config.FAISS_DIMENSION)), [c.content_id for c in contents], [c.id for c in contents]
+    )
+
+    for content_id, interaction_type in [("c0", "like"), ("c1", "click")]:
+        crud.create_interaction(db, InteractionCreate(user_id="u1", content_id=content_id,
+                                                      interaction_type=interaction_type))
+    assert recommender._get_history_profile_embedding(db, "u1") is not None
+
+    interaction = crud.create_interaction(db, InteractionCreate(user_id="u1", content_id="c2",
+                                                                interaction_type="skip"))
+    recommender.observe_interaction(db, interaction)
+    incremental = recommender._get_history_profile_embedding(db, "u1")
+
+    recommender.history_profile_cache.clear()
+    rebuilt = recommender._get_history_profile_embedding(db, "u1")
+    assert np.linalg.norm(rebuilt) == pytest.approx(1.0)
+    assert incremental == pytest.approx(rebuilt, abs=1e-5)
+
+def test_regenerating_embeddings_only_encodes_changed_content(db, recommender):
+    for i in range(3):
+        crud.create_content(db, ContentCreate(content_id=f"c{i}", title=f"C{i}", category="ml", tags=["ml"]))
+
+    assert recommender.generate_all_embeddings(db) == 3
+    assert recommender.generate_all_embeddings(db) == 0
+
+    crud.get_content(db, "c1").title = "C1 revised"
+    crud.create_content(db, ContentCreate(content_id="c3", title="C3", category="ml", tags=["ml"]))
+    assert recommender.generate_all_embeddings(db) == 2
+    assert recommender.embedding_manager.encoded_texts[-2:] == ["C1 revised ml ml", "C3 ml ml"]
+    assert recommender.vector_db.index.ntotal == 4
+
+def test_embeddings_stream_in_chunks_and_drop_deleted_content(db, recommender, monkeypatch):
+    monkeypatch.setattr(Config, "EMBEDDING_CHUNK_SIZE", 2)
+    for i in range(5):
+        crud.create_content(db, ContentCreate(content_id=f"c{i}", title=f"C{i}", category="ml", tags=["ml"]))
+
+    assert recommender.generate_all_embeddings(db) == 5
+    progress = recommender.embedding_progress.as_dict()
+    assert (progress["total"], progress["encoded"], progress["chunks"], progress["running"]) == (5, 5, 3, False)
+
+    db.delete(crud.get_content(db, "c2"))
+    db.commit()
+    crud.create_content(db, ContentCreate(content_id="c5", title="C5", category="ml", tags=["ml"]))
+    assert recommender.generate_all_embeddings(db) == 1
+    assert recommender.embedding_progress.reused == 4
+    assert sorted(recommender.vector_db.id_to_content_map.values()) == ["c0", "c1", "c3", "c4", "c5"]
+    assert recommender.vector_db.index.ntotal == 5
+
+def test_hnsw_regeneration_is_incremental_and_unchanged_runs_keep_version(db, recommender, monkeypatch):
+    monkeypatch.setattr(Config, "FAISS_FLAT_MAX_VECTORS", 1)
+    monkeypatch.setattr(Config, "FAISS_IVF_MAX_VECTORS", 2)
+    for i in range(6):
+        crud.create_content(db, ContentCreate(content_id=f"c{i}", title=f"C{i}", category="ml", tags=["ml"]))
+    assert recommender.generate_all_embeddings(db) == 6
+    assert recommender.vector_db.index_type == "hnsw"
+
+    rebuilds = []
+    rebuild = recommender.vector_db.rebuild
+    monkeypatch.setattr(recommender.vector_db, "rebuild", lambda *args: rebuilds.append(len(args[1])) or rebuild(*args))
+    version, model_version = recommender.vector_db.version, recommender.model_version
+
+    # Nothing changed: no rebuild, no new saved generation, same model version
+    assert recommender.generate_all_embeddings(db) == 0
+    assert rebuilds == [] and recommender.model_version == model_version
+    assert VectorDatabase().version == version
+
+    # New content is added to the graph, only replacements rebuild it (once per run)
+    crud.create_content(db, ContentCreate(content_id="c6", title="C6", category="ml", tags=["ml"]))
+    assert recommender.generate_all_embeddings(db) == 1
+    assert rebuilds == [] and recommender.vector_db.version == str(int(version) + 1)
+    crud.get_content(db, "c1").title = "C1 revised"
+    crud.get_content(db, "c2").title = "C2 revised"
+    assert recommender.generate_all_embeddings(db) == 2
+    assert rebuilds == [7] and recommender.vector_db.version == str(int(version) + 2)
+    assert recommender.vector_db.index.ntotal == 7
+    assert VectorDatabase().version == recommender.vector_db.version
+
+def test_workers_pick_up_models_saved_by_another_worker(db, recommender, tmp_path, monkeypatch):
+    from app.ml import engine
+    monkeypatch.setattr(Config, "MODEL_REFRESH_SECONDS", 60)
+    for user_id, content_id, interaction_type in INTERACTIONS:
+        crud.create_interaction(db, InteractionCreate(user_id=user_id, content_id=content_id,
+                                                      interaction_type=interaction_type))
+    for content_id in {content_id for _, content_id, _ in INTERACTIONS}:
+        crud.create_content(db, ContentCreate(content_id=content_id, title=content_id, category="ml", tags=["ml"]))
+    other_worker = recommender_module.HybridRecommender()
+    monkeypatch.setattr(engine, "_recommender", other_worker)
+    monkeypatch.setattr(engine, "_last_refresh_check", 0.0)
+    try:
+        # This worker trains and saves; the other one only sees the files and the cf_models row
+        recommender.generate_all_embeddings(db)
+        cf_model = recommender_module.fit_cf_model(db)
+        artifact_path = cf_model.save(str(tmp_path / "cf"))
+        crud.save_cf_model(db, cf_model.get_model_metadata(), len(cf_model.user_map), len(cf_model.item_map),
+                           artifact_path=artifact_path)
+        assert other_worker.cf_model.version is None and other_worker.vector_db.version is None
+
+        engine.refresh_if_stale(db)
+        assert other_worker.vector_db.version == recommender.vector_db.version
+        assert other_worker.cf_model.version == cf_model.version
+        assert "alice" in other_worker.cf_model.user_map
+
+        # Checks are throttled: a newer save isn't looked for again within MODEL_REFRESH_SECONDS
+        crud.create_content(db, ContentCreate(content_id="new", title="New", category="ml", tags=["ml"]))
+        recommender.generate_all_embeddings(db)
+        engine.refresh_if_stale(db)
+        assert other_worker.vector_db.version != recommender.vector_db.version
+        monkeypatch.setattr(engine, "_last_refresh_check", 0.0)
+        engine.refresh_if_stale(db)
+        assert other_worker.vector_db.version == recommender.vector_db.version
+        assert not other_worker.refresh(db)
+    finally:
+        other_worker.embedding_batcher.close()
+
+def test_materialized_recommendations_follow_interactions_and_model_version(db, recommender, monkeypatch):
+    monkeypatch.setattr(Config, "MATERIALIZED_TOP_N", 3)
+    crud.create_user(db, UserCreate(user_id="u1", interests=["ml"], skill_level="beginner"))
+    for i in range(5):
+        crud.create_content(db, ContentCreate(content_id=f"c{i}", title=f"C{i}", category="ml", tags=["ml"]))
+    catalog.load(db)
+
+    live = recommender.recommend(db, "u1", 2)
+    served, computed_at = recommender.recommend_materialized(db, "u1", 2)
+    assert served == live
+    assert recommender.recommend_materialized(db, "u1", 2) == (served, computed_at)
+    assert crud.get_materialized_recommendations(db, "u1").n_recommendations == 3
+
+    # Deeper than stored: recomputed at the requested depth
+    assert len(recommender.recommend_materialized(db, "u1", 4)[0]) == 4
+    assert crud.get_materialized_recommendations(db, "u1").n_recommendations == 4
+
+    crud.create_interaction(db, InteractionCreate(user_id="u1", content_id=served[0]["content_id"],
+                                                  interaction_type="like"))
+    assert crud.get_materialized_recommendations(db, "u1") is None
+    served, _ = recommender.recommend_materialized(db, "u1", 2)
+    assert live[0]["content_id"] not in [rec["content_id"] for rec in served]
+
+    stored_version = crud.get_materialized_recommendations(db, "u1").model_version
+    cf_model = CollaborativeFiltering(n_factors=2)
+    cf_model.build_interaction_matrix(INTERACTIONS)
+    cf_model.version = "v2"
+    recommender.publish_cf_model(cf_model)
+    recommender.recommend_materialized(db, "u1", 2)
+    assert crud.get_materialized_recommendations(db, "u1").model_version != stored_version
+
+    assert recommender.materialize_all(db) == 1
+
+def test_materialized_lists_match_live_recommendations_for_warm_users(db, recommender, monkeypatch):
+    monkeypatch.setattr(Config, "MATERIALIZED_TOP_N", 20)
+    monkeypatch.setattr(Config, "SIMILARITY_THRESHOLD", -1.0)
+    tags = ["ml", "python", "web", "data", "cloud"]
+    for i in range(30):
+        crud.create_content(db, ContentCreate(content_id=f"c{i}", title=f"C{i}", category="ml",
+                                              tags=[tags[i % 5], tags[i % 3]]))
+    for u in range(6):
+        crud.create_user(db, UserCreate(user_id=f"u{u}", interests=[tags[u % 5]], skill_level="beginner"))
+        for i in range(u, 30, 5):
+            crud.create_interaction(db, InteractionCreate(user_id=f"u{u}", content_id=f"c{i}",
+                                                          interaction_type="like"))
+    recommender.generate_all_embeddings(db)
+    recommender.publish_cf_model(recommender_module.fit_cf_model(db))
+
+    for u in range(6):
+        live = recommender.recommend(db, f"u{u}", 3)
+        served, _ = recommender.recommend_materialized(db, f"u{u}", 3)
+        assert crud.get_materialized_recommendations(db, f"u{u}").n_recommendations == 20
+        assert [rec["content_id"] for rec in served] == [rec["content_id"] for rec in live]
+        assert [rec["score"] for rec in served] == pytest.approx([rec["score"] for rec in live], rel=1e-6)
+
+def test_training_job_runs_in_background_process_and_reports_back(tmp_path, monkeypatch):
+    # The job process reads its settings from the environment, like a deployed worker
+    database_url = f"sqlite:///{tmp_path / 'jobs.db'}"
+    monkeypatch.setenv("DATABASE_URL", database_url)
+    monkeypatch.setenv("CF_MODEL_DIR", str(tmp_path / "cf"))
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    file_db = sessionmaker(bind=engine)()
+    try:
+        for u in range(4):
+            crud.create_user(file_db, UserCreate(user_id=f"u{u}", interests=["ml"], skill_level="beginner"))
+        for i in range(4):
+            crud.create_content(file_db, ContentCreate(content_id=f"c{i}", title=f"C{i}", category="ml", tags=["ml"]))
+        for u in range(4):
+            for i in range(u, 4):
+                crud.create_interaction(file_db, InteractionCreate(user_id=f"u{u}", content_id=f"c{i}",
+                                                                   interaction_type="like"))
+
+        finished = []
+        manager = TrainingJobManager(max_workers=1, on_complete=[finished.append],
+                                     session_factory=sessionmaker(bind=engine))
+        job = manager.submit(retrain_cf=True, regenerate_embeddings=False)
+        assert manager.get(job.job_id) is job
+        manager.shutdown()
+
+        assert job.status == "completed", job.error
+        assert job.result == {"embeddings_generated": 0, "cf_model_trained": True, "recommendations_materialized": 0}
+        assert set(job.phases) == {"train_cf", "save_cf"}
+        assert finished == [job]
+
+        # Another server process reports the job from the training_jobs table
+        other_worker = TrainingJobManager(session_factory=sessionmaker(bind=engine))
+        reported = other_worker.get(job.job_id)
+        assert reported.as_dict() == job.as_dict()
+        assert [listed.job_id for listed in other_worker.list_jobs()] == [job.job_id]
+        assert other_worker.get("unknown") is None
+        assert crud.get_latest_cf_model(file_db).artifact_path.startswith(str(tmp_path / "cf"))
+    finally:
+        file_db.close()
+        catalog.invalidate()
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])